@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Produce
+from .models import Produce, MarketPrice
 
 # Register your models here.
-admin.site.register(Produce)
\ No newline at end of file
+admin.site.register(Produce)
+admin.site.register(MarketPrice)
\ No newline at end of file
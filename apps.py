@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dashboard'
+
+    def ready(self):
+        # Keeps ListingCounter and cached objects in step with their models and sets up the search index
+        from . import listings, marketplace, object_cache  # noqa: F401
@@ -0,0 +1,197 @@
+import asyncio
+import datetime
+import logging
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.shortcuts import render, redirect
+
+from .forms import CropRecommendationForm, FertilizerPredictionForm
+from .functions import GetResponse, getFertilizerFeatures
+from .inference import getCropFeatures
+from .prices import getMarketPriceIndex
+from .views import (
+    getDetailsFromUID, get_agro_news, get_listing_summary, load_chatbot_turn, finish_chatbot_turn,
+    cropBatcher, fertilizerBatcher, INFERENCE_TIMEOUT, WEATHER_UNAVAILABLE_MESSAGE,
+)
+from .weather import getWeather
+
+logger = logging.getLogger(__name__)
+
+# Async variants of the dashboard views that wait on external services. The
+# outbound calls go through the same pooled clients and caches as the sync
+# views, run on worker threads so the event loop keeps serving other requests
+# while upstreams are slow. ORM and session access stays on Django's sync thread.
+
+
+def offload(func):
+    return sync_to_async(func, thread_sensitive=False)
+
+
+render_async = sync_to_async(render)
+
+
+async def get_logged_user(request):
+    logged_id = await sync_to_async(request.session.get)("member_logged_id")
+    if not logged_id:
+        raise ValueError("User not logged in")
+    return await sync_to_async(getDetailsFromUID)(logged_id)
+
+
+async def error_redirect(request, message):
+    await sync_to_async(request.session.__setitem__)("error_message", message)
+    return redirect('/admin/404/')
+
+
+async def home_page(request):
+    try:
+        userlogged = await get_logged_user(request)
+
+        # Weather, news and listing counts are independent, fetch them together.
+        # News is read from (and synced into) the database, so it stays on the sync thread
+        details, news, listing_summary = await asyncio.gather(
+            offload(getWeather)(userlogged.coords),
+            sync_to_async(get_agro_news)(limit=3),
+            sync_to_async(get_listing_summary)(userlogged),
+        )
+        context = {
+            "user": userlogged,
+            **listing_summary,
+            'news': news,
+            'weather': details,
+        }
+        return await render_async(request, 'dash/home.html', context)
+    except Exception as e:
+        logger.error(f"Home page error: {str(e)}")
+        return await error_redirect(request, "An unexpected error occurred")
+
+
+async def news_page(request):
+    try:
+        userlogged = await get_logged_user(request)
+        keyword = request.GET.get("q", "").strip()
+        news = await sync_to_async(get_agro_news)(keyword=keyword or None)
+        context = {
+            'news': news,
+            'keyword': keyword,
+            'user': userlogged,
+            'userid': userlogged.id,
+        }
+        return await render_async(request, 'dash/news.html', context)
+    except Exception as e:
+        logger.error(f"News page error: {str(e)}")
+        return await error_redirect(request, "Please Login to Continue")
+
+
+async def crop_prices_page(request):
+    try:
+        userlogged = await get_logged_user(request)
+        price_index = await offload(getMarketPriceIndex)()
+        fetched_at = price_index.fetched_at
+        context = {
+            "userid": userlogged.id,
+            "user": userlogged,
+            "date": datetime.datetime.fromtimestamp(fetched_at) if fetched_at else datetime.datetime.now(),
+            "prices": price_index.records,
+            "prices_refreshing": fetched_at is None,
+        }
+        return await render_async(request, 'dash/check_prices.html', context)
+    except Exception as e:
+        logger.error(f"Crop prices error: {str(e)}")
+        return await error_redirect(request, "Please Login to Continue")
+
+
+async def _predict(batcher, features):
+    # sklearn prediction runs on an executor thread, never on the event loop
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, batcher.predict, features, INFERENCE_TIMEOUT)
+
+
+async def croprec(request):
+    try:
+        userlogged = await get_logged_user(request)
+        form = CropRecommendationForm(request.POST if request.method == 'POST' else None)
+        context = {'form': form, 'user': userlogged, 'userid': userlogged.id}
+
+        if request.method == 'POST' and form.is_valid():
+            weatherd = await offload(getWeather)(userlogged.coords)
+            if weatherd is None:
+                context['error'] = WEATHER_UNAVAILABLE_MESSAGE
+                return await render_async(request, 'dash/tools/crop_rec.html', context, status=503)
+            try:
+                features = getCropFeatures(
+                    form.cleaned_data['nitrogen'],
+                    form.cleaned_data['phosphorus'],
+                    form.cleaned_data['potassium'],
+                    weatherd[1],  # temp
+                    weatherd[2],  # humidity
+                    form.cleaned_data['PH'],
+                    form.cleaned_data['rainfall']
+                )
+                context['prediction'] = await _predict(cropBatcher, features)
+            except Exception as e:
+                logger.error(f"Crop recommendation prediction error: {str(e)}")
+                context['error'] = "Prediction failed"
+        return await render_async(request, 'dash/tools/crop_rec.html', context)
+    except Exception as e:
+        logger.error(f"Crop recommendation error: {str(e)}")
+        return await error_redirect(request, "Please Login to Continue")
+
+
+async def fertrec(request):
+    try:
+        userlogged = await get_logged_user(request)
+        form = FertilizerPredictionForm(request.POST if request.method == 'POST' else None)
+        context = {'form': form, 'user': userlogged, 'userid': userlogged.id}
+
+        if request.method == 'POST' and form.is_valid():
+            weatherd = await offload(getWeather)(userlogged.coords)
+            if weatherd is None:
+                context['error'] = WEATHER_UNAVAILABLE_MESSAGE
+                return await render_async(request, 'dash/tools/fert_rec.html', context, status=503)
+            try:
+                features = getFertilizerFeatures(
+                    form.cleaned_data['nitrogen'],
+                    form.cleaned_data['phosphorus'],
+                    form.cleaned_data['potassium'],
+                    weatherd[1],  # temp
+                    weatherd[2],  # humidity
+                    form.cleaned_data['moisture'],
+                    form.cleaned_data['soil_type'],
+                    form.cleaned_data['crop']
+                )
+                context['prediction'] = await _predict(fertilizerBatcher, features)
+            except Exception as e:
+                logger.error(f"Fertilizer recommendation error: {str(e)}")
+                context['error'] = "Prediction failed"
+        return await render_async(request, 'dash/tools/fert_rec.html', context)
+    except Exception as e:
+        logger.error(f"Fertilizer recommendation error: {str(e)}")
+        return await error_redirect(request, "Please Login to Continue")
+
+
+async def chatbot_api(request):
+    try:
+        if request.method != "POST":
+            return JsonResponse({"error": "Method not allowed"}, status=405)
+
+        logged_id = await sync_to_async(request.session.get)("member_logged_id")
+        if not logged_id:
+            return JsonResponse({"error": "User not logged in"}, status=401)
+
+        query = request.POST.get("query", "").strip()
+        if not query:
+            return JsonResponse({"error": "Query cannot be empty"}, status=400)
+
+        # Chat store reads and writes stay on the sync thread; only the Gemini
+        # call, which can take seconds, runs on a worker thread
+        conversation, conversation_history = await sync_to_async(load_chatbot_turn)(request.session)
+        response, updated_conversation_history = await offload(GetResponse)(query, conversation_history)
+        response_data, status = await sync_to_async(finish_chatbot_turn)(
+            conversation, response, updated_conversation_history
+        )
+        return JsonResponse(response_data, status=status)
+
+    except Exception as e:
+        logger.error(f"Chatbot API error: {str(e)}")
+        return JsonResponse({"error": str(e)}, status=500)
@@ -0,0 +1,167 @@
+import math
+
+import numpy as np
+
+# Emission factors in kg CO2-equivalent. Values are deliberately simple,
+# order-of-magnitude defaults (IPCC 2019 tier 1 style) so estimates are
+# reproducible; adjust them here rather than in the chatbot prompt.
+
+# Per machine-hour: typical fuel/energy use per hour x fuel factor
+MACHINERY_FACTORS = {"diesel": 8 * 2.68, "gasoline": 6 * 2.31, "electric": 10 * 0.71}
+RENEWABLE_ELECTRIC_SHARE = 0.2  # share of grid emissions left when the farm runs on renewables
+
+# Per kg (or litre) of product applied: manufacture + field N2O (+ CO2 from urea hydrolysis)
+FERTILIZER_FACTORS = {
+    "urea": 3.9,
+    "ammonium nitrate": 3.8,
+    "can": 3.2,
+    "dap": 1.9,
+    "npk": 2.0,
+    "ssp": 0.3,
+    "mop": 0.6,
+    "potash": 0.6,
+    "compost": 0.1,
+    "manure": 0.1,
+    "vermicompost": 0.1,
+}
+DEFAULT_FERTILIZER_FACTOR = 2.0
+
+# Per head per year: enteric methane, and manure methane before management
+ENTERIC_FACTORS = {"cattle": 980, "cow": 980, "buffalo": 1540, "goat": 140, "sheep": 140, "pig": 42, "poultry": 0, "chicken": 0}
+MANURE_FACTORS = {"cattle": 150, "cow": 150, "buffalo": 200, "goat": 20, "sheep": 20, "pig": 150, "poultry": 2, "chicken": 2}
+DEFAULT_ENTERIC_FACTOR = 500
+DEFAULT_MANURE_FACTOR = 80
+MANURE_MANAGEMENT_SHARE = {"stored": 1.0, "compost": 0.5, "spread": 0.3, "none": 0.1}
+
+# Per tonne-km
+TRANSPORT_FACTORS = {"truck": 0.1, "train": 0.03, "ship": 0.015}
+MILES_TO_KM = 1.609
+
+# Per hectare per season
+RESIDUE_FACTORS = {"burned": 141.0, "composted": 20.0, "left on field": 0.0, "removed": 0.0}
+# Per hectare per season (negative: carbon removed)
+SEQUESTRATION_FACTORS = {"cover_crops": -300.0, "agroforestry": -1000.0, "biochar_usage": -500.0}
+
+ACRES_TO_HECTARES = 0.4047
+
+COMPONENTS = ("machinery", "fertilizer", "livestock", "transport", "residue", "sequestration")
+
+
+def _number(value, default=0.0):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    # float() accepts "nan" and "inf", which would make the totals unserializable
+    if not math.isfinite(number):
+        raise ValueError(f"Not a finite number: {value!r}")
+    return number
+
+
+def _lookup(factors, name, default):
+    name = str(name or "").lower()
+    if name in factors:
+        return factors[name]
+    # "Urea (46% N)", "dairy cows" etc.
+    for key, factor in factors.items():
+        if key in name:
+            return factor
+    return default
+
+
+def hasEmissionInputs(profile):
+    """True when the structured fields are enough for a local estimate."""
+    practices = profile.get("farming_practices") or {}
+    livestock = profile.get("livestock_management") or {}
+    transport = profile.get("transportation_emissions") or {}
+    return bool(
+        profile.get("machinery_usage")
+        or practices.get("fertilizer_usage")
+        or (livestock.get("has_livestock") and livestock.get("livestock_count"))
+        or transport.get("distance_to_market")
+        or profile.get("crop_residue_management") in ("burned", "composted")
+    )
+
+
+def estimateEmissions(profiles):
+    """Emissions for many farm profiles at once.
+
+    Each profile uses the chatbot's structured schema. Returns a dict of
+    per-profile NumPy arrays, one per component plus "total" (kg CO2e).
+    Raises ValueError when a numeric field is NaN or infinite.
+    """
+    n = len(profiles)
+    area = np.zeros(n)
+    tonnes = np.zeros(n)
+    renewable = np.zeros(n, dtype=bool)
+    machinery_rows, fertilizer_rows = [], []
+    head = np.zeros(n)
+    enteric = np.zeros(n)
+    manure = np.zeros(n)
+    distance = np.zeros(n)
+    transport = np.zeros(n)
+    residue = np.zeros(n)
+    sequestration = np.zeros(n)
+
+    for i, profile in enumerate(profiles):
+        for crop in profile.get("crop_details") or []:
+            crop_area = _number(crop.get("area"))
+            if crop.get("unit") == "acres":
+                crop_area *= ACRES_TO_HECTARES
+            area[i] += crop_area
+            tonnes[i] += crop_area * _number(crop.get("crop_yield"))
+        renewable[i] = bool(profile.get("renewable_energy_usage"))
+
+        for machine in profile.get("machinery_usage") or []:
+            machinery_rows.append((i, _number(machine.get("hours_per_season")),
+                                   MACHINERY_FACTORS.get(machine.get("fuel_type"), MACHINERY_FACTORS["diesel"]),
+                                   machine.get("fuel_type") == "electric"))
+        practices = profile.get("farming_practices") or {}
+        for fertilizer in practices.get("fertilizer_usage") or []:
+            fertilizer_rows.append((i, _number(fertilizer.get("amount")) * _number(fertilizer.get("application_frequency"), 1.0),
+                                    _lookup(FERTILIZER_FACTORS, fertilizer.get("fertilizer_type"), DEFAULT_FERTILIZER_FACTOR)))
+
+        livestock = profile.get("livestock_management") or {}
+        if livestock.get("has_livestock", True):
+            head[i] = _number(livestock.get("livestock_count"))
+            enteric[i] = _lookup(ENTERIC_FACTORS, livestock.get("livestock_type"), DEFAULT_ENTERIC_FACTOR)
+            manure[i] = (_lookup(MANURE_FACTORS, livestock.get("livestock_type"), DEFAULT_MANURE_FACTOR)
+                         * MANURE_MANAGEMENT_SHARE.get(livestock.get("manure_management"), 1.0))
+
+        trip = profile.get("transportation_emissions") or {}
+        distance[i] = _number(trip.get("distance_to_market")) * (MILES_TO_KM if trip.get("unit") == "miles" else 1.0)
+        transport[i] = TRANSPORT_FACTORS.get(trip.get("transport_method"), TRANSPORT_FACTORS["truck"])
+
+        residue[i] = RESIDUE_FACTORS.get(profile.get("crop_residue_management"), 0.0)
+        practices_sequestered = profile.get("carbon_sequestration_practices") or {}
+        sequestration[i] = sum(factor for name, factor in SEQUESTRATION_FACTORS.items() if practices_sequestered.get(name))
+
+    # Area-based terms assume at least one hectare when the farm size is unknown
+    hectares = np.where(area > 0, area, 1.0)
+
+    results = {}
+    if machinery_rows:
+        index, hours, factor, electric = (np.array(column) for column in zip(*machinery_rows))
+        factor = np.where(electric & renewable[index], factor * RENEWABLE_ELECTRIC_SHARE, factor)
+        results["machinery"] = np.bincount(index, weights=hours * factor, minlength=n)
+    else:
+        results["machinery"] = np.zeros(n)
+    if fertilizer_rows:
+        index, amount, factor = (np.array(column) for column in zip(*fertilizer_rows))
+        index = index.astype(int)
+        # Amounts are totals for the farm (kg or litres per application), so no area term
+        results["fertilizer"] = np.bincount(index, weights=amount * factor, minlength=n)
+    else:
+        results["fertilizer"] = np.zeros(n)
+    results["livestock"] = head * (enteric + manure)
+    results["transport"] = distance * np.where(tonnes > 0, tonnes, 1.0) * transport
+    results["residue"] = residue * hectares
+    results["sequestration"] = sequestration * hectares
+    results["total"] = np.maximum(sum(results[name] for name in COMPONENTS), 0.0)
+    return results
+
+
+def estimateEmission(profile):
+    """Emission breakdown for a single profile, as plain floats rounded to 0.1 kg."""
+    results = estimateEmissions([profile])
+    return {name: round(float(values[0]), 1) for name, values in results.items()}
@@ -0,0 +1,83 @@
+from django.db import transaction
+
+from .chatbot import CHATBOT_HISTORY_MESSAGES, ConversationMemory
+from .models import ChatConversation, ChatTurn
+
+SESSION_KEY = "chat_conversation_id"
+CHATLOG_DISPLAY_TURNS = 100
+
+
+def getConversation(session, farmerid, create=True):
+    """The logged-in farmer's current conversation, creating one if needed.
+
+    Only the conversation id is kept in the session. Histories left in the
+    session by older versions are moved into the store the first time.
+    """
+    conversation_id = session.get(SESSION_KEY)
+    if conversation_id:
+        conversation = ChatConversation.objects.filter(id=conversation_id, farmerid=farmerid).first()
+        if conversation is not None:
+            return conversation
+    if not create:
+        return None
+    conversation = ChatConversation.objects.create(farmerid=farmerid)
+    legacy = session.pop("conversation_history", None)
+    session.pop("chatlog", None)
+    if legacy:
+        memory = ConversationMemory.from_state(legacy)
+        appendTurns(conversation, memory.messages, memory.to_state())
+    session[SESSION_KEY] = conversation.id
+    return conversation
+
+
+def loadHistoryState(conversation, limit=None):
+    """History state for ChatbotEngine: the stored summary plus the most recent
+    unsummarized turns, read newest-first through the (conversation, -id) index."""
+    limit = limit or CHATBOT_HISTORY_MESSAGES
+    turns = list(
+        conversation.turns.filter(id__gt=conversation.summarized_through_id)
+        .order_by("-id").values_list("role", "text")[:limit]
+    )
+    return {
+        "summary": conversation.summary or None,
+        "messages": [{"role": role, "parts": [{"text": text}]} for role, text in reversed(turns)],
+    }
+
+
+def appendTurns(conversation, messages, state):
+    """Append new messages and persist the updated summary.
+
+    `state` is the history state returned by the engine after the turn; every
+    stored turn older than the messages it still keeps verbatim is covered by
+    its summary.
+    """
+    with transaction.atomic():
+        ChatTurn.objects.bulk_create([
+            ChatTurn(conversation=conversation, role=message["role"],
+                     text="".join(part["text"] for part in message["parts"]))
+            for message in messages
+        ])
+        kept = len(state["messages"])
+        older = list(conversation.turns.order_by("-id").values_list("id", flat=True)[kept:kept + 1])
+        conversation.summary = state["summary"]
+        conversation.summarized_through_id = older[0] if older else conversation.summarized_through_id
+        conversation.save(update_fields=["summary", "summarized_through_id", "updated_at"])
+
+
+def recordTurn(conversation, state):
+    """Store the messages a single chatbot turn added to `state` (the user's
+    query and, unless the reply failed to parse, the assistant's reply)."""
+    messages = state["messages"]
+    added = 2 if len(messages) >= 2 and messages[-1]["role"] != "user" else 1
+    appendTurns(conversation, messages[-added:], state)
+
+
+def getChatlog(conversation, limit=CHATLOG_DISPLAY_TURNS):
+    """Recent turns in the {"queries": [...], "responses": [...]} shape the help page renders."""
+    chatlog = {"queries": [], "responses": []}
+    if conversation is None:
+        return chatlog
+    turns = conversation.turns.order_by("-id").values_list("role", "text")[:limit]
+    for role, text in reversed(list(turns)):
+        chatlog["queries" if role == "user" else "responses"].append(text)
+    return chatlog
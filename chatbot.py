@@ -0,0 +1,486 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from google import genai
+from google.genai import types
+
+from .response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+CHATBOT_MODEL = "gemini-2.0-flash"
+
+
+def getChatbotConfig():
+    return types.GenerateContentConfig(
+        temperature=1,
+        top_p=0.95,
+        top_k=40,
+        max_output_tokens=8192,
+        system_instruction="You are a farming expert. Ask the user necessary questions to gather data about their farming practices and provide recommendations to calculate their carbon emissions and optimize fertilizer use. Maintain context from previous messages.",
+        response_mime_type="application/json",
+        response_schema=genai.types.Schema(
+            type=genai.types.Type.OBJECT,
+            # CarbonEmission is optional: views compute it locally from the structured fields when they are known
+            required = [
+                "response",
+                "crop_details",
+                "farming_practices",
+                "machinery_usage",
+                "livestock_management",
+                "renewable_energy_usage",
+                "crop_residue_management",
+                "carbon_sequestration_practices",
+                "transportation_emissions",
+                "fertilizer_recommendations",
+                "suggestions"
+            ],
+            properties={
+                "CarbonEmission": genai.types.Schema(type=genai.types.Type.NUMBER, description="Estimated carbon emissions in kg CO2-equivalent"),
+                "response": genai.types.Schema(type=genai.types.Type.STRING, description="Explanation and recommendations"),
+                "crop_details": genai.types.Schema(
+                    type=genai.types.Type.ARRAY,
+                    items=genai.types.Schema(
+                        type=genai.types.Type.OBJECT,
+                        properties={
+                            "cropName": genai.types.Schema(type=genai.types.Type.STRING),
+                            "area": genai.types.Schema(type=genai.types.Type.NUMBER),
+                            "unit": genai.types.Schema(type=genai.types.Type.STRING, enum=["acres", "hectares"]),
+                            "crop_yield": genai.types.Schema(type=genai.types.Type.NUMBER),
+                        }
+                    )
+                ),
+                "farming_practices": genai.types.Schema(
+                    type=genai.types.Type.OBJECT,
+                    properties={
+                        "tillage_method": genai.types.Schema(type=genai.types.Type.STRING, enum=["conventional", "reduced", "no-till"]),
+                        "irrigation_type": genai.types.Schema(type=genai.types.Type.STRING, enum=["flood", "drip", "sprinkler", "none"]),
+                        "irrigation_frequency": genai.types.Schema(type=genai.types.Type.NUMBER),
+                        "fertilizer_usage": genai.types.Schema(
+                            type=genai.types.Type.ARRAY,
+                            items=genai.types.Schema(
+                                type=genai.types.Type.OBJECT,
+                                properties={
+                                    "fertilizer_type": genai.types.Schema(type=genai.types.Type.STRING),
+                                    "application_frequency": genai.types.Schema(type=genai.types.Type.NUMBER),
+                                    "amount": genai.types.Schema(type=genai.types.Type.NUMBER),
+                                    "unit": genai.types.Schema(type=genai.types.Type.STRING, enum=["kg", "liters"]),
+                                }
+                            )
+                        ),
+                    }
+                ),
+                "machinery_usage": genai.types.Schema(
+                    type=genai.types.Type.ARRAY,
+                    items=genai.types.Schema(
+                        type=genai.types.Type.OBJECT,
+                        properties={
+                            "machinery_type": genai.types.Schema(type=genai.types.Type.STRING),
+                            "hours_per_season": genai.types.Schema(type=genai.types.Type.NUMBER),
+                            "fuel_type": genai.types.Schema(type=genai.types.Type.STRING, enum=["diesel", "gasoline", "electric"]),
+                        }
+                    )
+                ),
+                "livestock_management": genai.types.Schema(
+                    type=genai.types.Type.OBJECT,
+                    properties={
+                        "has_livestock": genai.types.Schema(type=genai.types.Type.BOOLEAN),
+                        "livestock_count": genai.types.Schema(type=genai.types.Type.NUMBER),
+                        "livestock_type": genai.types.Schema(type=genai.types.Type.STRING),
+                        "manure_management": genai.types.Schema(type=genai.types.Type.STRING, enum=["compost", "spread", "stored", "none"]),
+                    }
+                ),
+                "renewable_energy_usage": genai.types.Schema(type=genai.types.Type.BOOLEAN),
+                "crop_residue_management": genai.types.Schema(type=genai.types.Type.STRING, enum=["burned", "left on field", "composted", "removed"]),
+                "carbon_sequestration_practices": genai.types.Schema(
+                    type=genai.types.Type.OBJECT,
+                    properties={
+                        "cover_crops": genai.types.Schema(type=genai.types.Type.BOOLEAN),
+                        "agroforestry": genai.types.Schema(type=genai.types.Type.BOOLEAN),
+                        "biochar_usage": genai.types.Schema(type=genai.types.Type.BOOLEAN),
+                    }
+                ),
+                "transportation_emissions": genai.types.Schema(
+                    type=genai.types.Type.OBJECT,
+                    properties={
+                        "distance_to_market": genai.types.Schema(type=genai.types.Type.NUMBER),
+                        "unit": genai.types.Schema(type=genai.types.Type.STRING, enum=["km", "miles"]),
+                        "transport_method": genai.types.Schema(type=genai.types.Type.STRING, enum=["truck", "train", "ship"]),
+                    }
+                ),
+                "fertilizer_recommendations": genai.types.Schema(
+                    type=genai.types.Type.ARRAY,
+                    items=genai.types.Schema(
+                        type=genai.types.Type.OBJECT,
+                        properties={
+                            "fertilizer_type": genai.types.Schema(type=genai.types.Type.STRING),
+                            "amount": genai.types.Schema(type=genai.types.Type.NUMBER),
+                            "unit": genai.types.Schema(type=genai.types.Type.STRING, enum=["kg", "liters"]),
+                            "best_time_to_apply": genai.types.Schema(type=genai.types.Type.STRING),
+                            "reason": genai.types.Schema(type=genai.types.Type.STRING),
+                        }
+                    )
+                ),
+                "suggestions": genai.types.Schema(
+                    type=genai.types.Type.ARRAY,
+                    items=genai.types.Schema(type=genai.types.Type.STRING)
+                ),
+            }
+        )
+    )
+
+
+def toContentHistory(conversation_history):
+    # Convert conversation_history from dicts (if loaded from session) to types.Content
+    return [
+        types.Content(
+            role=item["role"],
+            parts=[types.Part.from_text(text=p["text"]) for p in item["parts"]]
+        )
+        if isinstance(item, dict) else item
+        for item in conversation_history or []
+    ]
+
+
+def serializeHistory(conversation_history):
+    # Convert conversation_history to a JSON-serializable format
+    return [
+        {
+            "role": item.role,
+            "parts": [{"text": part.text} for part in item.parts]
+        }
+        for item in conversation_history
+    ]
+
+
+class IncrementalJsonFields:
+    """Parses a top-level JSON object as it streams in.
+
+    feed() returns a list of events for the text received so far:
+    ("delta", text) for newly arrived characters of `text_field` while that
+    string is still being generated, and ("field", key, value) each time a
+    top-level field is complete.
+    """
+
+    def __init__(self, text_field="response"):
+        self.text_field = text_field
+        self.buffer = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.phase = "key"
+        self.key = None
+        self.start = None
+        self.emitted = 0
+
+    def _text_delta(self, end, final=False):
+        raw = self.buffer[self.start + 1:end]
+        if not final:
+            # Hold back a trailing, possibly incomplete escape sequence
+            backslash = raw.rfind("\\", max(0, len(raw) - 6))
+            if backslash != -1:
+                raw = raw[:backslash]
+        try:
+            text = json.loads(f'"{raw}"')
+        except ValueError:
+            return None
+        if not final and text and "\ud800" <= text[-1] <= "\udbff":
+            # High half of a surrogate pair (an emoji under ensure_ascii); wait for the low half
+            text = text[:-1]
+        delta, self.emitted = text[self.emitted:], len(text)
+        return ("delta", delta) if delta else None
+
+    def _finish_value(self, end, events):
+        if self.start is None:
+            return
+        if self.key == self.text_field and self.buffer[self.start] == '"':
+            delta = self._text_delta(self.buffer.rindex('"', self.start, end), final=True)
+            if delta:
+                events.append(delta)
+        try:
+            events.append(("field", self.key, json.loads(self.buffer[self.start:end])))
+        except ValueError:
+            pass
+        self.key, self.start, self.emitted = None, None, 0
+
+    def feed(self, text):
+        self.buffer += text
+        events = []
+        buffer = self.buffer
+        for i in range(self.pos, len(buffer)):
+            ch = buffer[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.depth == 1 and self.phase == "key":
+                        self.key = json.loads(buffer[self.start:i + 1])
+                        self.start = None
+                        self.phase = "colon"
+            elif ch == '"':
+                self.in_string = True
+                if self.depth == 1 and (self.phase == "key" or self.start is None):
+                    self.start = i
+            elif ch in "{[":
+                if self.depth == 1 and self.phase == "value" and self.start is None:
+                    self.start = i
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if self.depth == 0 and self.phase == "value":
+                    self._finish_value(i, events)
+            elif self.depth == 1:
+                if ch == ":" and self.phase == "colon":
+                    self.phase = "value"
+                elif ch == "," and self.phase == "value":
+                    self._finish_value(i, events)
+                    self.phase = "key"
+                elif not ch.isspace() and self.phase == "value" and self.start is None:
+                    self.start = i
+        self.pos = len(buffer)
+        if (self.in_string and self.depth == 1 and self.phase == "value"
+                and self.key == self.text_field and self.start is not None):
+            delta = self._text_delta(len(buffer))
+            if delta:
+                events.append(delta)
+        return events
+
+
+# Messages kept verbatim; older ones are folded into the running summary
+CHATBOT_HISTORY_MESSAGES = getattr(settings, 'CHATBOT_HISTORY_MESSAGES', 8)
+# Upper bound on the serialized size of the history sent with each turn
+CHATBOT_HISTORY_BYTES = getattr(settings, 'CHATBOT_HISTORY_BYTES', 16000)
+FARM_PROFILE_FIELDS = (
+    "crop_details", "farming_practices", "machinery_usage", "livestock_management",
+    "renewable_energy_usage", "crop_residue_management", "carbon_sequestration_practices",
+    "transportation_emissions",
+)
+SUMMARY_QUESTIONS = 5
+SUMMARY_QUESTION_CHARS = 160
+
+
+class ConversationMemory:
+    """Bounded chat history: the last few messages verbatim plus a running
+    summary of everything older.
+
+    The summary holds the structured farm-profile fields from earlier replies
+    (latest value wins) and a short list of earlier questions, so each turn
+    sends roughly the same amount of context however long the chat gets.
+    """
+
+    def __init__(self, messages=(), summary=None, max_messages=None, max_bytes=None):
+        self.messages = list(messages)
+        self.summary = summary or {"profile": {}, "earlier_questions": []}
+        self.max_messages = max_messages or CHATBOT_HISTORY_MESSAGES
+        self.max_bytes = max_bytes or CHATBOT_HISTORY_BYTES
+
+    @classmethod
+    def from_state(cls, state, **limits):
+        if isinstance(state, dict):
+            return cls(state.get("messages", ()), state.get("summary"), **limits)
+        # Sessions from before the history was bounded store a plain message list
+        memory = cls(serializeHistory(toContentHistory(state)), **limits)
+        memory.compact()
+        return memory
+
+    def to_state(self):
+        return {"summary": self.summary, "messages": self.messages}
+
+    def add(self, role, text):
+        self.messages.append({"role": role, "parts": [{"text": text}]})
+
+    @staticmethod
+    def _merge_profile(profile, text):
+        try:
+            reply = json.loads(text)
+        except ValueError:
+            return
+        if isinstance(reply, dict):
+            for field in FARM_PROFILE_FIELDS:
+                if reply.get(field) not in (None, "", [], {}):
+                    profile[field] = reply[field]
+
+    def _fold(self, message):
+        text = "".join(part["text"] for part in message["parts"])
+        if message["role"] == "user":
+            questions = self.summary["earlier_questions"]
+            questions.append(text[:SUMMARY_QUESTION_CHARS])
+            del questions[:-SUMMARY_QUESTIONS]
+        else:
+            self._merge_profile(self.summary["profile"], text)
+
+    def farm_profile(self):
+        """Everything known about the farm so far, including the verbatim messages."""
+        profile = dict(self.summary["profile"])
+        for message in self.messages:
+            if message["role"] != "user":
+                self._merge_profile(profile, "".join(part["text"] for part in message["parts"]))
+        return profile
+
+    def cache_context(self):
+        """Response-cache context: the farm profile plus the latest exchange, so a
+        follow-up such as "yes" is only shared between identical conversation states."""
+        return {
+            "profile": self.farm_profile(),
+            "last_exchange": ["".join(part["text"] for part in message["parts"]) for message in self.messages[-2:]],
+        }
+
+    def size(self):
+        return len(json.dumps(self.context()))
+
+    def compact(self):
+        # Always keep the latest exchange, even if it alone exceeds the budget
+        while len(self.messages) > 2 and (len(self.messages) > self.max_messages or self.size() > self.max_bytes):
+            self._fold(self.messages.pop(0))
+
+    def context(self):
+        """Messages to send to the model ahead of the new query."""
+        if not (self.summary["profile"] or self.summary["earlier_questions"]):
+            return list(self.messages)
+        note = (
+            "Summary of our earlier conversation (farm profile gathered so far and questions already asked): "
+            + json.dumps(self.summary)
+        )
+        return [{"role": "user", "parts": [{"text": note}]}] + self.messages
+
+
+class ChatbotEngine:
+    """Holds the Gemini client (and its connection pool) and the response
+    config/schema, built once per process. Each turn only builds its message
+    list."""
+
+    def __init__(self, api_key=None, model=CHATBOT_MODEL, client=None, config=None, response_cache=None):
+        self.model = model
+        self.client = client or genai.Client(api_key=api_key or os.environ.get('GEMINI_API_KEY'))
+        self.config = config or getChatbotConfig()
+        # Optional ResponseCache answering repeated questions for the same farm profile and last exchange
+        self.response_cache = response_cache
+
+    def build_contents(self, query, conversation_history=None):
+        """Returns (memory, contents): the bounded history and the message list to send."""
+        memory = ConversationMemory.from_state(conversation_history)
+        contents = toContentHistory(memory.context())
+        # Append the new user query
+        contents.append(
+            types.Content(
+                role="user",
+                parts=[types.Part.from_text(text=query)],
+            )
+        )
+        return memory, contents
+
+    def generate(self, contents):
+        for chunk in self.client.models.generate_content_stream(
+            model=self.model,
+            contents=contents,
+            config=self.config,
+        ):
+            if chunk.text:
+                yield chunk.text
+
+    def _cached(self, query, memory):
+        """Returns (cached response text or None, conversation context used as cache key)."""
+        if self.response_cache is None:
+            return None, None
+        context = memory.cache_context()
+        return self.response_cache.get(query, context), context
+
+    def _remember(self, query, context, response, started):
+        if self.response_cache is not None:
+            self.response_cache.put(query, context, response, latency=time.monotonic() - started)
+
+    def _finish(self, memory, query, response=None):
+        # Record the turn, then fold older messages into the summary
+        memory.add("user", query)
+        if response is not None:
+            memory.add("assistant", response)
+        memory.compact()
+        return memory.to_state()
+
+    def respond(self, query, conversation_history=None):
+        """One blocking turn. Returns (response_json, history_state)."""
+        print("Query:", query)
+        memory, contents = self.build_contents(query, conversation_history)
+        cached, context = self._cached(query, memory)
+        if cached is not None:
+            return json.loads(cached), self._finish(memory, query, cached)
+        response = ''
+        try:
+            started = time.monotonic()
+            response = ''.join(self.generate(contents))
+            # Parse the response as JSON
+            response_json = json.loads(response)
+            self._remember(query, context, response, started)
+            print("Response:", response_json)
+            return response_json, self._finish(memory, query, response)
+        except json.JSONDecodeError:
+            print("Error: JSONDecodeError")
+            return {"response": response}, self._finish(memory, query)
+        except Exception as e:
+            print(f"Error in GetResponse: {str(e)}")
+            return {"error": f"Failed to get response: {str(e)}"}, memory.to_state()
+
+    def respond_stream(self, query, conversation_history=None):
+        """Streaming turn.
+
+        Yields ("delta", text) and ("field", key, value) events while Gemini
+        generates, then a final ("done", response_json, history_state) or
+        ("error", message).
+        """
+        memory, contents = self.build_contents(query, conversation_history)
+        parser = IncrementalJsonFields()
+        cached, context = self._cached(query, memory)
+        if cached is not None:
+            yield from parser.feed(cached)
+            yield ("done", json.loads(cached), self._finish(memory, query, cached))
+            return
+        response = ''
+        try:
+            started = time.monotonic()
+            for text in self.generate(contents):
+                response += text
+                yield from parser.feed(text)
+
+            try:
+                response_json = json.loads(response)
+            except json.JSONDecodeError:
+                logger.error("Chatbot stream returned invalid JSON")
+                yield ("done", {"response": response}, self._finish(memory, query))
+                return
+            self._remember(query, context, response, started)
+            yield ("done", response_json, self._finish(memory, query, response))
+        except Exception as e:
+            logger.error(f"Error in GetResponseStream: {str(e)}")
+            yield ("error", f"Failed to get response: {str(e)}")
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def getChatbotEngine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                response_cache = None
+                if getattr(settings, 'CHATBOT_RESPONSE_CACHE', True):
+                    response_cache = ResponseCache(
+                        max_entries=getattr(settings, 'CHATBOT_RESPONSE_CACHE_ENTRIES', 1024),
+                        ttl=getattr(settings, 'CHATBOT_RESPONSE_CACHE_TTL', 86400),
+                        threshold=getattr(settings, 'CHATBOT_RESPONSE_CACHE_SIMILARITY', 0.85),
+                    )
+                _engine = ChatbotEngine(response_cache=response_cache)
+    return _engine
+
+
+def GetResponseStream(query, conversation_history=None):
+    return getChatbotEngine().respond_stream(query, conversation_history)
@@ -0,0 +1,106 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import User
+from .news import getLatestNews, ingestNewsArticles
+from .object_cache import FEEDS_WORKER, getOrCompute
+from .prices import refreshMarketPrices
+from .weather import getWeatherCellKey, refreshWeatherCell
+
+logger = logging.getLogger(__name__)
+
+NEWS_SYNC_KEY = 'agro_news_synced'
+# Without the feeds worker, one request per hour pulls the new articles
+NEWS_FRESHNESS = {'timeout': 3600, 'stale_timeout': 86400}
+
+# Seconds between runs of each feed in the ingest_feeds worker
+FEED_INTERVALS = {'news': 3600, 'prices': 3000, 'weather': 900, **getattr(settings, 'FEED_INTERVALS', {})}
+FEED_STATUS_KEY = 'feed_status_{}'
+WEATHER_REFRESH_WORKERS = 8
+
+
+def _syncNews():
+    # None is not cached, so a failed fetch is retried by the next request
+    try:
+        ingestNewsArticles()
+    except RuntimeError as e:
+        logger.error(f"News sync failed: {str(e)}")
+        return None
+    return time.time()
+
+
+def getNews(limit=20, keyword=None):
+    """Latest stored agriculture news; only reads the database when the feeds worker runs."""
+    getOrCompute(NEWS_SYNC_KEY, _syncNews, read_only=FEEDS_WORKER, **NEWS_FRESHNESS)
+    return getLatestNews(limit, keyword)
+
+
+def ingestPrices():
+    count = refreshMarketPrices()
+    if not count:
+        raise RuntimeError("Market price fetch returned no records")
+    return count
+
+
+def ingestWeather():
+    """Refresh every grid cell that holds at least one registered farm."""
+    cells = {}
+    for coords in User.objects.values_list('coords', flat=True).iterator():
+        try:
+            key, cell = getWeatherCellKey(coords)
+        except (TypeError, ValueError, IndexError):
+            continue
+        cells[key] = cell
+    with ThreadPoolExecutor(max_workers=WEATHER_REFRESH_WORKERS) as pool:
+        results = list(pool.map(refreshWeatherCell, cells.values()))
+    refreshed = sum(result is not None for result in results)
+    if cells and not refreshed:
+        raise RuntimeError(f"All {len(cells)} weather cells failed to refresh")
+    return refreshed
+
+
+FEEDS = {
+    'news': ingestNewsArticles,
+    'prices': ingestPrices,
+    'weather': ingestWeather,
+}
+
+
+def getFeedStatus(name):
+    return cache.get(FEED_STATUS_KEY.format(name)) or {'feed': name, 'interval': FEED_INTERVALS[name]}
+
+
+def getFeedStatuses():
+    return [getFeedStatus(name) for name in FEEDS]
+
+
+def runFeed(name):
+    """Run one feed now and record its last-run time, duration and outcome."""
+    status = getFeedStatus(name)
+    started = time.time()
+    try:
+        items = FEEDS[name]()
+        status.update(ok=True, items=items, error=None, last_success=started)
+    except Exception as e:
+        logger.error(f"Feed {name} failed: {str(e)}")
+        status.update(ok=False, error=str(e))
+    status.update(
+        feed=name,
+        interval=FEED_INTERVALS[name],
+        last_run=started,
+        duration_ms=round((time.time() - started) * 1000, 1),
+        runs=status.get('runs', 0) + 1,
+    )
+    cache.set(FEED_STATUS_KEY.format(name), status, timeout=None)
+    return status
+
+
+def secondsUntilDue(name, now=None):
+    last_run = getFeedStatus(name).get('last_run')
+    if last_run is None:
+        return 0.0
+    return max(last_run + FEED_INTERVALS[name] - (now or time.time()), 0.0)
@@ -1,24 +1,36 @@
 import requests
 import pandas as pd
 from sklearn.preprocessing import LabelEncoder
-from google import genai
-from google.genai import types
 import os
 from dotenv import load_dotenv
 import json
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
+from .http_client import getClient
+from .chatbot import getChatbotEngine
 load_dotenv()
 
-fertilizerdata = pd.read_csv("datasets/Fertilizer Prediction.csv") 
 weather_api_key = os.environ.get('WEATHER_API_KEY')
 newsapi_api_key = os.environ.get('NEWSAPI_API_KEY')
-gemini_api_key = os.environ.get('GEMINI_API_KEY')
 govdata_api_key = os.environ.get('GOVDATA_API_KEY')
+govdata_api_url = os.environ.get('GOVDATA_API_URL', "https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070")
+MARKET_PRICE_STATES = ["Kerala", "Uttrakhand", "Uttar Pradesh", "Rajasthan", "Nagaland", "Gujarat", "Maharashtra", "Tripura", "Punjab", "Bihar", "Telangana", "Meghalaya"]
+
+# One pooled client per upstream, see http_client.py
+weather_client = getClient("weatherapi", timeout=(3.05, 5))
+news_client = getClient("newsapi", timeout=(3.05, 10))
+govdata_client = getClient("govdata", timeout=(3.05, 15), retries=3, backoff_factor=0.5, pool_size=len(MARKET_PRICE_STATES))
+
 def getWeatherDetails(coords):
     lat, lon = coords[0], coords[1]
-    weather_url = f"http://api.weatherapi.com/v1/current.json?key={weather_api_key}&q={lat},{lon}&aqi=no"
-
-    response = requests.get(weather_url)
-    data = response.json()
+    try:
+        data = weather_client.get_json(
+            "http://api.weatherapi.com/v1/current.json",
+            params={"key": weather_api_key, "q": f"{lat},{lon}", "aqi": "no"},
+        )
+    except requests.RequestException as e:
+        print(f"Error fetching weather: {e}")
+        return None
 
     if "error" in data:
         print(f"Error: {data['error']['message']}")
@@ -32,212 +44,106 @@ def getWeatherDetails(coords):
 
     return [weather, temp, humidity, wind_speed, pressure]
 
-def getAgroNews():
-    newsapi_url = f"https://newsapi.org/v2/everything?q=agriculture&apiKey={newsapi_api_key}"
-    response = requests.get(newsapi_url)
-    data = response.json()
-    return data["articles"][:20]
+NEWS_PAGE_SIZE = 20
+
+def getAgroNews(since=None, until=None, page=1, page_size=NEWS_PAGE_SIZE):
+    # Newest first; `since` and `until` (ISO 8601, inclusive) bound the publish time.
+    # None when the request fails, so callers can tell a failure from an empty page
+    params = {"q": "agriculture", "sortBy": "publishedAt", "pageSize": page_size, "page": page, "apiKey": newsapi_api_key}
+    if since:
+        params["from"] = since
+    if until:
+        params["to"] = until
+    try:
+        data = news_client.get_json("https://newsapi.org/v2/everything", params=params)
+    except requests.RequestException as e:
+        print(f"Error fetching news: {e}")
+        return None
+    return data.get("articles", [])[:page_size]
+
+def loadFertilizerEncoders(path="datasets/Fertilizer Prediction.csv"):
+    # Fit the soil/crop label encoders once and keep them as read-only
+    # label -> code lookup tables, so predictions never touch the dataset.
+    data = pd.read_csv(path, usecols=["Soil Type", "Crop Type"])
+    encoders = []
+    for column in ("Soil Type", "Crop Type"):
+        classes = LabelEncoder().fit(data[column].astype(str)).classes_
+        encoders.append(MappingProxyType({label: code for code, label in enumerate(classes)}))
+    return tuple(encoders)
+
+soil_type_codes, crop_type_codes = loadFertilizerEncoders()
+
+def encodeFertilizerLabel(codes, label, kind):
+    try:
+        return codes[str(label)]
+    except KeyError:
+        raise ValueError(f"Unknown {kind}: {label!r}") from None
+
+def getFertilizerFeatures(nitrogen, phosphorus, potassium, temp, humidity, moisture, soil_type, crop):
+    soil_enc = encodeFertilizerLabel(soil_type_codes, soil_type, "soil type")
+    crop_enc = encodeFertilizerLabel(crop_type_codes, crop, "crop type")
+    return [temp, humidity, moisture, soil_enc, crop_enc, nitrogen, potassium, phosphorus]
 
 def getFertilizerRecommendation(model, nitrogen, phosphorus, potassium, temp, humidity, moisture, soil_type, crop):
-    le_soil = LabelEncoder()
-    fertilizerdata['Soil Type'] = le_soil.fit_transform(fertilizerdata['Soil Type'])
-    le_crop = LabelEncoder()
-    fertilizerdata['Crop Type'] = le_crop.fit_transform(fertilizerdata['Crop Type'])
-    soil_enc = le_soil.transform([str(soil_type)])[0]
-    crop_enc = le_crop.transform([crop])[0]
-    user_input = [[temp,humidity,moisture,soil_enc,crop_enc,nitrogen,potassium,phosphorus]]
+    user_input = [getFertilizerFeatures(nitrogen, phosphorus, potassium, temp, humidity, moisture, soil_type, crop)]
     prediction = model.predict(user_input)
     return prediction[0]
 
-def getMarketPricesAllStates():
-    states = ["Kerala", "Uttrakhand", "Uttar Pradesh", "Rajasthan", "Nagaland", "Gujarat", "Maharashtra", "Tripura", "Punjab", "Bihar", "Telangana", "Meghalaya"]
+GOVDATA_PAGE_SIZE = 500
+
+def getMarketPricesForState(state, base_url=None, client=None, page_size=GOVDATA_PAGE_SIZE):
+    client = client or govdata_client
+    records = []
+    offset = 0
+    while True:
+        data = client.get_json(
+            base_url or govdata_api_url,
+            params={
+                "api-key": govdata_api_key,
+                "format": "json",
+                "filters[state]": state,
+                "offset": offset,
+                "limit": page_size,
+            },
+        )
+        page = data.get("records", [])
+        records.extend(page)
+        offset += len(page)
+        # The API may cap limit below page_size, so a short page is not the end
+        total = data.get("total")
+        if not page or (total is not None and offset >= int(total)):
+            return records
+
+def getMarketPricesAllStates(states=None, base_url=None, client=None, previous=None):
+    # One worker per state, so a cold fetch takes about as long as the slowest state.
+    # A state whose fetch fails keeps its records from `previous` (an earlier result)
+    # instead of dropping out; if every state fails there is nothing new and [] is returned.
+    states = states or MARKET_PRICE_STATES
+
+    def fetch(state):
+        try:
+            return getMarketPricesForState(state, base_url=base_url, client=client)
+        except (requests.RequestException, ValueError) as e:
+            print(f"Error fetching market prices for {state}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=len(states)) as pool:
+        results = list(pool.map(fetch, states))
+    if all(records is None for records in results):
+        return []
+    kept = {}
+    for record in previous or ():
+        kept.setdefault(record.get("state"), []).append(record)
     final_list = []
-    for state in states:
-        state = state.replace(" ", "+")
-        govdata_url = f"https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070?api-key={govdata_api_key}&format=json&filters%5Bstate%5D={state}"
-        response = requests.get(govdata_url)
-        data = response.json()
-        for entries in data["records"]:
-            final_list.append(entries)
-
+    for state, records in zip(states, results):
+        if records is None:
+            records = kept.get(state, [])
+            print(f"Keeping {len(records)} previous market price records for {state}")
+        final_list.extend(records)
     return final_list
 
 
 
 def GetResponse(query, conversation_history=None):
-    print("Query:", query)
-    if conversation_history is None:
-            conversation_history = []
-
-    # Convert conversation_history from dicts (if loaded from session) to types.Content
-    if conversation_history and isinstance(conversation_history[0], dict):
-        conversation_history = [
-            types.Content(
-                role=item["role"],
-                parts=[types.Part.from_text(text=p["text"]) for p in item["parts"]]
-            )
-            for item in conversation_history
-        ]
-
-    # Append the new user query
-    conversation_history.append(
-        types.Content(
-            role="user",
-            parts=[types.Part.from_text(text=query)],
-        )
-    )
-    try:
-        client = genai.Client(api_key=gemini_api_key)
-        model = "gemini-2.0-flash"
-
-        generate_content_config = types.GenerateContentConfig(
-            temperature=1,
-            top_p=0.95,
-            top_k=40,
-            max_output_tokens=8192,
-            system_instruction="You are a farming expert. Ask the user necessary questions to gather data about their farming practices and provide recommendations to calculate their carbon emissions and optimize fertilizer use. Maintain context from previous messages.",
-            response_mime_type="application/json",
-            response_schema=genai.types.Schema(
-                type=genai.types.Type.OBJECT,
-                required = [
-                    "CarbonEmission",
-                    "response",
-                    "crop_details",
-                    "farming_practices",
-                    "machinery_usage",
-                    "livestock_management",
-                    "renewable_energy_usage",
-                    "crop_residue_management",
-                    "carbon_sequestration_practices",
-                    "transportation_emissions",
-                    "fertilizer_recommendations",
-                    "suggestions"
-                ],
-                properties={
-                    "CarbonEmission": genai.types.Schema(type=genai.types.Type.NUMBER, description="Estimated carbon emissions in kg CO2-equivalent"),
-                    "response": genai.types.Schema(type=genai.types.Type.STRING, description="Explanation and recommendations"),
-                    "crop_details": genai.types.Schema(
-                        type=genai.types.Type.ARRAY,
-                        items=genai.types.Schema(
-                            type=genai.types.Type.OBJECT,
-                            properties={
-                                "cropName": genai.types.Schema(type=genai.types.Type.STRING),
-                                "area": genai.types.Schema(type=genai.types.Type.NUMBER),
-                                "unit": genai.types.Schema(type=genai.types.Type.STRING, enum=["acres", "hectares"]),
-                                "crop_yield": genai.types.Schema(type=genai.types.Type.NUMBER),
-                            }
-                        )
-                    ),
-                    "farming_practices": genai.types.Schema(
-                        type=genai.types.Type.OBJECT,
-                        properties={
-                            "tillage_method": genai.types.Schema(type=genai.types.Type.STRING, enum=["conventional", "reduced", "no-till"]),
-                            "irrigation_type": genai.types.Schema(type=genai.types.Type.STRING, enum=["flood", "drip", "sprinkler", "none"]),
-                            "irrigation_frequency": genai.types.Schema(type=genai.types.Type.NUMBER),
-                            "fertilizer_usage": genai.types.Schema(
-                                type=genai.types.Type.ARRAY,
-                                items=genai.types.Schema(
-                                    type=genai.types.Type.OBJECT,
-                                    properties={
-                                        "fertilizer_type": genai.types.Schema(type=genai.types.Type.STRING),
-                                        "application_frequency": genai.types.Schema(type=genai.types.Type.NUMBER),
-                                        "amount": genai.types.Schema(type=genai.types.Type.NUMBER),
-                                        "unit": genai.types.Schema(type=genai.types.Type.STRING, enum=["kg", "liters"]),
-                                    }
-                                )
-                            ),
-                        }
-                    ),
-                    "machinery_usage": genai.types.Schema(
-                        type=genai.types.Type.ARRAY,
-                        items=genai.types.Schema(
-                            type=genai.types.Type.OBJECT,
-                            properties={
-                                "machinery_type": genai.types.Schema(type=genai.types.Type.STRING),
-                                "hours_per_season": genai.types.Schema(type=genai.types.Type.NUMBER),
-                                "fuel_type": genai.types.Schema(type=genai.types.Type.STRING, enum=["diesel", "gasoline", "electric"]),
-                            }
-                        )
-                    ),
-                    "livestock_management": genai.types.Schema(
-                        type=genai.types.Type.OBJECT,
-                        properties={
-                            "has_livestock": genai.types.Schema(type=genai.types.Type.BOOLEAN),
-                            "livestock_count": genai.types.Schema(type=genai.types.Type.NUMBER),
-                            "livestock_type": genai.types.Schema(type=genai.types.Type.STRING),
-                            "manure_management": genai.types.Schema(type=genai.types.Type.STRING, enum=["compost", "spread", "stored", "none"]),
-                        }
-                    ),
-                    "renewable_energy_usage": genai.types.Schema(type=genai.types.Type.BOOLEAN),
-                    "crop_residue_management": genai.types.Schema(type=genai.types.Type.STRING, enum=["burned", "left on field", "composted", "removed"]),
-                    "carbon_sequestration_practices": genai.types.Schema(
-                        type=genai.types.Type.OBJECT,
-                        properties={
-                            "cover_crops": genai.types.Schema(type=genai.types.Type.BOOLEAN),
-                            "agroforestry": genai.types.Schema(type=genai.types.Type.BOOLEAN),
-                            "biochar_usage": genai.types.Schema(type=genai.types.Type.BOOLEAN),
-                        }
-                    ),
-                    "transportation_emissions": genai.types.Schema(
-                        type=genai.types.Type.OBJECT,
-                        properties={
-                            "distance_to_market": genai.types.Schema(type=genai.types.Type.NUMBER),
-                            "unit": genai.types.Schema(type=genai.types.Type.STRING, enum=["km", "miles"]),
-                            "transport_method": genai.types.Schema(type=genai.types.Type.STRING, enum=["truck", "train", "ship"]),
-                        }
-                    ),
-                    "fertilizer_recommendations": genai.types.Schema(
-                        type=genai.types.Type.ARRAY,
-                        items=genai.types.Schema(
-                            type=genai.types.Type.OBJECT,
-                            properties={
-                                "fertilizer_type": genai.types.Schema(type=genai.types.Type.STRING),
-                                "amount": genai.types.Schema(type=genai.types.Type.NUMBER),
-                                "unit": genai.types.Schema(type=genai.types.Type.STRING, enum=["kg", "liters"]),
-                                "best_time_to_apply": genai.types.Schema(type=genai.types.Type.STRING),
-                                "reason": genai.types.Schema(type=genai.types.Type.STRING),
-                            }
-                        )
-                    ),
-                    "suggestions": genai.types.Schema(
-                        type=genai.types.Type.ARRAY,
-                        items=genai.types.Schema(type=genai.types.Type.STRING)
-                    ),
-                }
-            )
-        )
-        response = ''
-        for chunk in client.models.generate_content_stream(
-            model=model,
-            contents=conversation_history,
-            config=generate_content_config,
-        ):
-            response += chunk.text
-
-        # Parse the response as JSON
-        response_json = json.loads(response)
-
-        # Append the bot's response to the conversation history
-        conversation_history.append(
-            types.Content(
-                role="assistant",
-                parts=[types.Part.from_text(text=response)],
-            )
-        )
-
-        # Convert conversation_history to a JSON-serializable format
-        serializable_history = [
-            {
-                "role": item.role,
-                "parts": [{"text": part.text} for part in item.parts]
-            }
-            for item in conversation_history
-        ]
-        print("Response:", response_json)
-        return response_json, serializable_history
-    except json.JSONDecodeError:
-        print("Error: JSONDecodeError")
-        return {"response": response}, conversation_history
-    except Exception as e:
-        print(f"Error in GetResponse: {str(e)}")
-        return {"error": f"Failed to get response: {str(e)}"}, conversation_history
\ No newline at end of file
+    # The Gemini client and response schema live in a per-process engine, see chatbot.py
+    return getChatbotEngine().respond(query, conversation_history)
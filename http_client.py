@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised when an upstream's circuit is open and no last-known-good data exists."""
+
+
+def getPooledSession(pool_size=10, retries=3, backoff_factor=0.5, backoff_max=5):
+    # Keep-alive session whose adapter retries idempotent GETs with exponential backoff,
+    # never sleeping more than backoff_max seconds between attempts
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        backoff_max=backoff_max,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and lets a single
+    trial call through once `reset_timeout` seconds have passed."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class UpstreamClient:
+    """Outbound JSON client for one upstream service.
+
+    Requests share a pooled keep-alive session with connect/read timeouts and
+    bounded retries. Failures feed a circuit breaker; while it is open (or
+    when a call fails) the last good response for the same request is served
+    instead, if there is one.
+    """
+
+    def __init__(self, name, timeout=(3.05, 10), retries=2, backoff_factor=0.3, backoff_max=5, pool_size=10,
+                 failure_threshold=5, reset_timeout=30, max_cached=256):
+        self.name = name
+        self.timeout = timeout
+        self.session = getPooledSession(pool_size=pool_size, retries=retries, backoff_factor=backoff_factor,
+                                        backoff_max=backoff_max)
+        self.breaker = CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+        self.max_cached = max_cached
+        self._last_good = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "errors": 0, "short_circuited": 0, "stale_served": 0}
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self.last_error = None
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _fallback(self, key, error):
+        with self._lock:
+            if key in self._last_good:
+                self._counters["stale_served"] += 1
+                return self._last_good[key]
+        raise error
+
+    def get_json(self, url, params=None, timeout=None):
+        key = (url, tuple(sorted((params or {}).items())))
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            return self._fallback(key, CircuitOpenError(f"Circuit open for {self.name}"))
+
+        started = time.monotonic()
+        try:
+            response = self.session.get(url, params=params, timeout=timeout or self.timeout)
+            # 4xx means the upstream is up but rejected this request; only 5xx counts against it
+            if response.status_code >= 500:
+                response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            self.breaker.record_failure()
+            with self._lock:
+                self._counters["requests"] += 1
+                self._counters["errors"] += 1
+                self.last_error = str(e)
+            return self._fallback(key, e)
+
+        elapsed = time.monotonic() - started
+        self.breaker.record_success()
+        with self._lock:
+            self._counters["requests"] += 1
+            self._latency_total += elapsed
+            self._latency_max = max(self._latency_max, elapsed)
+            if response.ok:
+                self._last_good[key] = data
+                self._last_good.move_to_end(key)
+                while len(self._last_good) > self.max_cached:
+                    self._last_good.popitem(last=False)
+        return data
+
+    def stats(self):
+        with self._lock:
+            succeeded = self._counters["requests"] - self._counters["errors"]
+            return {
+                "name": self.name,
+                "circuit": self.breaker.state,
+                **self._counters,
+                "mean_latency_ms": round(self._latency_total / succeeded * 1000, 2) if succeeded else 0.0,
+                "max_latency_ms": round(self._latency_max * 1000, 2),
+                "last_error": self.last_error,
+            }
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def getClient(name, **options):
+    """Return the process-wide client for an upstream, creating it on first use."""
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = UpstreamClient(name, **options)
+        return _clients[name]
+
+
+def getUpstreamStats():
+    with _clients_lock:
+        clients = list(_clients.values())
+    return [client.stats() for client in clients]
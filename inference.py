@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError
+from queue import Empty, Queue
+
+import numpy as np
+
+from .functions import getFertilizerFeatures
+
+# Column order expected by model_code/CropRecommend.pkl
+CROP_FEATURES = ["nitrogen", "phosphorus", "potassium", "temperature", "humidity", "PH", "rainfall"]
+# Input fields for model_code/Fertilizer.pkl; getFertilizerFeatures does the ordering/encoding
+FERTILIZER_FIELDS = ["nitrogen", "phosphorus", "potassium", "temperature", "humidity", "moisture", "soil_type", "crop"]
+
+def getCropFeatures(nitrogen, phosphorus, potassium, temp, humidity, ph, rainfall):
+    return [float(nitrogen), float(phosphorus), float(potassium), float(temp), float(humidity), float(ph), float(rainfall)]
+
+def _rowFeatures(kind, row, weather):
+    values = dict(row)
+    # Rows without their own readings fall back to the requesting user's weather
+    if weather:
+        values.setdefault("temperature", weather[1])
+        values.setdefault("humidity", weather[2])
+    if kind == "crop":
+        return getCropFeatures(*[values[name] for name in CROP_FEATURES])
+    fields = [values[name] for name in FERTILIZER_FIELDS]
+    numeric = [float(value) for value in fields[:6]]
+    return getFertilizerFeatures(*numeric, *fields[6:])
+
+def buildFeatureMatrix(kind, rows, weather=None):
+    """Vectorize input rows into one matrix.
+
+    Returns (matrix, indices, errors) where indices maps matrix rows back to
+    positions in `rows` and errors maps positions of rejected rows to a message.
+    """
+    features, indices, errors = [], [], {}
+    for position, row in enumerate(rows):
+        try:
+            features.append(_rowFeatures(kind, row, weather))
+            indices.append(position)
+        except KeyError as e:
+            errors[position] = f"Missing field: {e.args[0]}"
+        except (TypeError, ValueError) as e:
+            errors[position] = str(e)
+    width = len(CROP_FEATURES) if kind == "crop" else len(FERTILIZER_FIELDS)
+    matrix = np.array(features, dtype=float) if features else np.empty((0, width))
+    return matrix, indices, errors
+
+def predictBatch(model, matrix):
+    """Run one predict (and predict_proba when the model has it) over the whole matrix."""
+    if len(matrix) == 0:
+        return [], None
+    predictions = model.predict(matrix)
+    confidence = None
+    if hasattr(model, "predict_proba"):
+        try:
+            confidence = model.predict_proba(matrix).max(axis=1)
+        except Exception:
+            confidence = None
+    return predictions, confidence
+
+def iterBatchResults(kind, model, rows, weather=None):
+    """Predict every row up front, then return an iterator of one result dict
+    per input row, in input order, for streaming back to the client."""
+    matrix, indices, errors = buildFeatureMatrix(kind, rows, weather)
+    predictions, confidence = predictBatch(model, matrix)
+    results = {}
+    for n, position in enumerate(indices):
+        results[position] = {"prediction": str(predictions[n])}
+        if confidence is not None:
+            results[position]["confidence"] = round(float(confidence[n]), 4)
+    return (
+        {"row": position, **(results.get(position) or {"error": errors[position]})}
+        for position in range(len(rows))
+    )
+
+
+class MicroBatcher:
+    """Collects single-row predictions arriving within a short window and runs
+    them through one vectorized predict call.
+
+    Callers block in predict() until their batch has run. A batch is flushed
+    when it reaches max_batch rows or max_wait seconds after its first row
+    arrived, whichever comes first.
+    """
+
+    def __init__(self, predict, max_batch=32, max_wait=0.003, name="model"):
+        self.name = name
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._predict = predict
+        self._queue = Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._rows = 0
+        self._batch_sizes = {}
+        self._waits = deque(maxlen=1024)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=f"microbatch-{self.name}", daemon=True)
+                self._worker.start()
+
+    def submit(self, features):
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((time.monotonic(), features, future))
+        return future
+
+    def predict(self, features, timeout=None):
+        """Prediction for one row; raises TimeoutError if its batch has not run within timeout."""
+        future = self.submit(features)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            # Drops the row if its batch has not started yet
+            future.cancel()
+            raise
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = first[0] + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Callers that timed out have cancelled their futures; skip those rows
+            batch = [item for item in self._collect() if item[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.monotonic()
+            try:
+                predictions = self._predict(np.array([features for _, features, _ in batch], dtype=float))
+                for (_, _, future), prediction in zip(batch, predictions):
+                    future.set_result(prediction)
+                if len(predictions) < len(batch):
+                    raise RuntimeError(
+                        f"{self.name} model returned {len(predictions)} predictions for {len(batch)} rows"
+                    )
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            self._record(batch, started)
+
+    def _record(self, batch, started):
+        bucket = 1 << (len(batch) - 1).bit_length()
+        with self._lock:
+            self._batches += 1
+            self._rows += len(batch)
+            self._batch_sizes[bucket] = self._batch_sizes.get(bucket, 0) + 1
+            self._waits.extend(started - enqueued for enqueued, _, _ in batch)
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            batches, rows, sizes = self._batches, self._rows, dict(self._batch_sizes)
+
+        def percentile(p):
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 3) if waits else 0.0
+
+        return {
+            "name": self.name,
+            "queue_depth": self._queue.qsize(),
+            "batches": batches,
+            "rows": rows,
+            "mean_batch_size": round(rows / batches, 2) if batches else 0.0,
+            # Histogram keyed by power-of-two upper bound: {"1": n, "2": n, "4": n, ...}
+            "batch_size_histogram": {str(size): sizes[size] for size in sorted(sizes)},
+            "wait_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "max": percentile(1.0)},
+        }
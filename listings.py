@@ -0,0 +1,148 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F, Subquery
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .forms import CropProduceListForm
+from .models import ListingCounter, Produce
+from .object_cache import invalidateListings
+
+ALL_FARMERS = ListingCounter.ALL_FARMERS
+IMPORT_BATCH_SIZE = 500
+EXPORT_FIELDS = ["id", "name", "price", "quantity", "unit", "created_at"]
+
+
+def rebuildListingCounters():
+    """Recount every farmer's listings from the Produce table."""
+    counts = dict(Produce.objects.order_by().values_list("farmerid").annotate(n=Count("id")))
+    counts[ALL_FARMERS] = sum(counts.values())
+    with transaction.atomic():
+        ListingCounter.objects.all().delete()
+        ListingCounter.objects.bulk_create(
+            [ListingCounter(farmerid=farmerid, count=count) for farmerid, count in counts.items()]
+        )
+
+
+def adjustListingCounts(deltas):
+    """Apply {farmerid: change} to the counters, e.g. after a bulk_create of listings
+    (which does not send post_save).
+
+    Call this after the listings have been written: until the counters are
+    seeded, the first change recounts everything instead of applying deltas
+    to rows that do not reflect the listings already stored.
+    """
+    deltas = Counter({farmerid: delta for farmerid, delta in deltas.items() if delta})
+    if not deltas:
+        return
+    for farmerid in deltas:
+        invalidateListings(farmerid)
+    if not ListingCounter.objects.filter(farmerid=ALL_FARMERS).exists():
+        rebuildListingCounters()
+        return
+    deltas[ALL_FARMERS] += sum(deltas.values())
+    with transaction.atomic():
+        ListingCounter.objects.bulk_create(
+            [ListingCounter(farmerid=farmerid) for farmerid in deltas], ignore_conflicts=True
+        )
+        for farmerid, delta in deltas.items():
+            ListingCounter.objects.filter(farmerid=farmerid).update(count=F("count") + delta)
+
+
+@receiver(post_save, sender=Produce)
+def countNewListing(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        adjustListingCounts({instance.farmerid: 1})
+
+
+@receiver(post_delete, sender=Produce)
+def countDeletedListing(sender, instance, **kwargs):
+    adjustListingCounts({instance.farmerid: -1})
+
+
+def _counter(farmerid):
+    return Subquery(ListingCounter.objects.filter(farmerid=farmerid).values("count")[:1])
+
+
+def getListingSummary(farmerid):
+    """The farmer's latest listing with their listing count and the global count.
+
+    One query in the usual case: the latest listing comes from the
+    (farmerid, -created_at) index and both counts are annotated onto it from
+    ListingCounter, so nothing scans the listing table. Once the counters are
+    seeded, a farmer without a counter row has no listings.
+    """
+    for attempt in range(2):
+        last_listing = (
+            Produce.objects.filter(farmerid=farmerid)
+            .order_by("-created_at", "-id")
+            .annotate(produces_count=_counter(farmerid), public_produces_count=_counter(ALL_FARMERS))
+            .first()
+        )
+        if last_listing is not None:
+            produces_count = last_listing.produces_count
+            public_produces_count = last_listing.public_produces_count
+        else:
+            produces_count = 0
+            public_produces_count = (
+                ListingCounter.objects.filter(farmerid=ALL_FARMERS).values_list("count", flat=True).first()
+            )
+        if public_produces_count is not None or attempt:
+            break
+        # First use on an existing database: the counters have not been built yet
+        rebuildListingCounters()
+
+    return {
+        "produces_count": produces_count or 0,
+        "public_produces_count": public_produces_count or 0,
+        "last_listing": last_listing or "",
+    }
+
+
+def validateListingRows(rows):
+    """Check uploaded rows with the CropProduceListForm rules.
+
+    Returns (cleaned_rows, errors) where errors maps the 1-based row number
+    to the form's field errors.
+    """
+    cleaned, errors = [], {}
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors[number] = {"__all__": ["Expected an object with name, price and quantity"]}
+            continue
+        form = CropProduceListForm(row)
+        if form.is_valid():
+            cleaned.append(form.cleaned_data)
+        else:
+            errors[number] = form.errors.get_json_data()
+    return cleaned, errors
+
+
+def importListings(farmerid, rows, batch_size=IMPORT_BATCH_SIZE):
+    """Validate and insert many listings for one farmer.
+
+    Nothing is inserted unless every row is valid. Returns (created, errors).
+    """
+    cleaned, errors = validateListingRows(rows)
+    if errors:
+        return 0, errors
+    with transaction.atomic():
+        Produce.objects.bulk_create(
+            [Produce(**data, farmerid=farmerid, unit="quintals") for data in cleaned],
+            batch_size=batch_size,
+        )
+        # bulk_create sends no post_save, so count the listings here
+        adjustListingCounts({farmerid: len(cleaned)})
+    return len(cleaned), {}
+
+
+def iterListingRows(farmerid, chunk_size=2000):
+    """The farmer's listings as dicts, oldest first, streamed from the database."""
+    listings = Produce.objects.filter(farmerid=farmerid).order_by("created_at", "id").values_list(*EXPORT_FIELDS)
+    for values in listings.iterator(chunk_size=chunk_size):
+        row = dict(zip(EXPORT_FIELDS, values))
+        row["price"] = float(row["price"])
+        row["quantity"] = float(row["quantity"])
+        row["created_at"] = row["created_at"].isoformat()
+        yield row
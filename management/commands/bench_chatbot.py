@@ -0,0 +1,68 @@
+import contextlib
+import io
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from google import genai
+from google.genai import types
+
+from dashboard.chatbot import ChatbotEngine, getChatbotConfig, toContentHistory
+
+STUB_REPLY = json.dumps({"CarbonEmission": 42.0, "response": "Use 50 kg urea per acre.", "suggestions": []})
+
+
+class StubChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModels:
+    # Stands in for the Gemini transport: replies instantly with a canned answer
+    def generate_content_stream(self, model, contents, config):
+        for start in range(0, len(STUB_REPLY), 16):
+            yield StubChunk(STUB_REPLY[start:start + 16])
+
+
+class StubClient:
+    models = StubModels()
+
+
+def per_request_turn(query, history):
+    # The old GetResponse path: new client and config on every call
+    genai.Client(api_key="bench")
+    config = getChatbotConfig()
+    contents = toContentHistory(history)
+    contents.append(types.Content(role="user", parts=[types.Part.from_text(text=query)]))
+    return "".join(chunk.text for chunk in StubClient.models.generate_content_stream(
+        model="stub", contents=contents, config=config))
+
+
+class Command(BaseCommand):
+    help = "Measure per-request chatbot overhead with and without a reused ChatbotEngine, using a stubbed model"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200)
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        history = [{"role": "user", "parts": [{"text": "I grow wheat on 2 acres"}]},
+                   {"role": "assistant", "parts": [{"text": STUB_REPLY}]}]
+        engine = ChatbotEngine(client=StubClient())
+
+        def measure(turn):
+            timings = []
+            # GetResponse logs every query/response, keep that out of the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                for _ in range(iterations):
+                    started = time.perf_counter()
+                    turn()
+                    timings.append((time.perf_counter() - started) * 1000)
+            return statistics.median(timings), max(timings)
+
+        before = measure(lambda: per_request_turn("How much urea?", history))
+        after = measure(lambda: engine.respond("How much urea?", history))
+        self.stdout.write(f"per-request client+config: median {before[0]:.3f} ms, max {before[1]:.3f} ms")
+        self.stdout.write(f"shared ChatbotEngine:      median {after[0]:.3f} ms, max {after[1]:.3f} ms")
+        self.stdout.write(f"saved per request:         {before[0] - after[0]:.3f} ms ({before[0] / after[0]:.1f}x)")
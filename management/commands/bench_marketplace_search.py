@@ -0,0 +1,59 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from dashboard.marketplace import ensureSearchIndex, searchListings
+from dashboard.models import Produce
+
+SCENARIOS = [
+    ("browse newest", {}),
+    ("common term", {"query": "rice"}),
+    ("rare phrase", {"query": "organic cardamom"}),
+    ("prefix", {"query": "pomegr"}),
+    ("term + price range", {"query": "wheat", "min_price": 2000, "max_price": 2500}),
+    ("term + quantity", {"query": "onion", "min_quantity": 400}),
+    ("last 7 days", {"since_days": 7}),
+]
+
+
+class Command(BaseCommand):
+    help = "Time marketplace searches (first page and deep keyset pages); seed data with seed_listings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--pages", type=int, default=50, help="Follow the cursor this many pages for the deep-page timing")
+
+    def handle(self, *args, **options):
+        ensureSearchIndex()
+        self.stdout.write(f"{Produce.objects.count()} listings")
+        self.stdout.write(f"{'scenario':<22}{'first page ms (median/p95)':>30}{'page N ms':>12}{'results':>10}")
+        for label, filters in SCENARIOS:
+            filters = dict(filters)
+            if "since_days" in filters:
+                filters["since"] = timezone.now() - timezone.timedelta(days=filters.pop("since_days"))
+
+            timings = []
+            for _ in range(options["iterations"]):
+                started = time.perf_counter()
+                page, cursor = searchListings(limit=options["limit"], **filters)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+
+            # Walk the cursor, then time one more page at that depth
+            for _ in range(options["pages"]):
+                if cursor is None:
+                    break
+                _, cursor = searchListings(limit=options["limit"], cursor=cursor, **filters)
+            deep = "-"
+            if cursor is not None:
+                started = time.perf_counter()
+                searchListings(limit=options["limit"], cursor=cursor, **filters)
+                deep = f"{(time.perf_counter() - started) * 1000:.2f}"
+
+            self.stdout.write(
+                f"{label:<22}{statistics.median(timings):>18.2f} / {p95:<9.2f}{deep:>12}{len(page):>10}"
+            )
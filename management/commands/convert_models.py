@@ -0,0 +1,38 @@
+import os
+import pickle
+
+import joblib
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.model_registry import fileChecksum, modelRegistry
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert the pickled prediction models to uncompressed joblib files (whose arrays can be "
+        "memory-mapped) and write a .sha256 checksum next to each"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("names", nargs="*", help="Models to convert (default: all registered)")
+
+    def handle(self, *args, **options):
+        names = options["names"] or list(modelRegistry.artifacts)
+        for name in names:
+            if name not in modelRegistry:
+                raise CommandError(f"Unknown model: {name}")
+            base = os.path.join(modelRegistry.directory, modelRegistry.artifacts[name])
+            source, target = base + ".pkl", base + ".joblib"
+            if not os.path.exists(source):
+                raise CommandError(f"{source} not found")
+            with open(source, "rb") as f:
+                model = pickle.load(f)
+            # Compression would rule out memory-mapping on load
+            joblib.dump(model, target, compress=0)
+            checksum = fileChecksum(target)
+            with open(target + ".sha256", "w") as f:
+                f.write(f"{checksum}  {os.path.basename(target)}\n")
+            self.stdout.write(
+                f"{name}: {source} ({os.path.getsize(source)} bytes) -> {target} "
+                f"({os.path.getsize(target)} bytes), sha256 {checksum}"
+            )
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.feeds import FEEDS, runFeed, secondsUntilDue
+
+
+class Command(BaseCommand):
+    help = (
+        "Pull the news, market price and weather feeds on their FEED_INTERVALS schedule and cache them "
+        "locally. Run it with DASHBOARD_FEEDS_WORKER=True so requests only read the cached feeds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--feed", action="append", choices=sorted(FEEDS), help="Only run this feed (repeatable)")
+        parser.add_argument("--once", action="store_true", help="Run each selected feed once and exit")
+
+    def report(self, status):
+        outcome = f"{status['items']} items" if status["ok"] else f"FAILED: {status['error']}"
+        self.stdout.write(f"{status['feed']:<8} {status['duration_ms']:>10.1f} ms  {outcome}")
+
+    def handle(self, *args, **options):
+        feeds = options["feed"] or list(FEEDS)
+        if options["once"]:
+            failed = [name for name in feeds if not self.report_run(name)]
+            if failed:
+                raise CommandError(f"Failed feeds: {', '.join(failed)}")
+            return
+
+        self.stdout.write(f"Scheduling feeds: {', '.join(feeds)}")
+        try:
+            while True:
+                for name in feeds:
+                    if secondsUntilDue(name) == 0:
+                        self.report_run(name)
+                time.sleep(max(min(min(secondsUntilDue(name) for name in feeds), 60), 1))
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
+
+    def report_run(self, name):
+        status = runFeed(name)
+        self.report(status)
+        return status["ok"]
@@ -0,0 +1,63 @@
+import datetime
+import random
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from dashboard.listings import adjustListingCounts
+from dashboard.models import Produce
+
+COMMODITIES = [
+    "wheat", "rice", "basmati rice", "maize", "bajra", "jowar", "ragi", "barley", "tur dal", "moong",
+    "urad", "chana", "masoor", "groundnut", "mustard", "soybean", "sunflower", "cotton", "jute",
+    "sugarcane", "onion", "potato", "tomato", "brinjal", "cabbage", "cauliflower", "okra", "chilli",
+    "turmeric", "ginger", "garlic", "coriander", "cumin", "banana", "mango", "grapes", "pomegranate",
+    "apple", "orange", "papaya", "coconut", "cashew", "arecanut", "tea", "coffee", "cardamom", "pepper",
+]
+QUALIFIERS = ["", "", "organic", "fresh", "dried", "premium", "grade a", "local", "hybrid", "desi"]
+
+
+class Command(BaseCommand):
+    help = "Insert synthetic marketplace listings for search benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100000)
+        parser.add_argument("--farmers", type=int, default=1000, help="Spread listings over farmer ids 1..N")
+        parser.add_argument("--days", type=int, default=365, help="Spread created_at over the last N days")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        now = timezone.now()
+        span = options["days"] * 86400
+        created_at = Produce._meta.get_field("created_at")
+        per_farmer = Counter()
+        remaining = options["count"]
+
+        # Let bulk_create keep the generated timestamps
+        created_at.auto_now_add = False
+        try:
+            with transaction.atomic():
+                while remaining > 0:
+                    batch = []
+                    for _ in range(min(remaining, options["batch_size"])):
+                        farmerid = rng.randint(1, options["farmers"])
+                        per_farmer[farmerid] += 1
+                        batch.append(Produce(
+                            farmerid=farmerid,
+                            name=f"{rng.choice(QUALIFIERS)} {rng.choice(COMMODITIES)}".strip(),
+                            price=rng.randint(800, 12000),
+                            quantity=rng.randint(1, 500),
+                            unit="quintals",
+                            created_at=now - datetime.timedelta(seconds=rng.randrange(span)),
+                        ))
+                    Produce.objects.bulk_create(batch)
+                    remaining -= len(batch)
+                adjustListingCounts(per_farmer)
+        finally:
+            created_at.auto_now_add = True
+
+        self.stdout.write(f"Inserted {options['count']} listings for {len(per_farmer)} farmers")
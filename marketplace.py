@@ -0,0 +1,50 @@
+import datetime
+
+from .models import Produce
+from .prices import decodeCursor, encodeCursor
+from .search_index import FullTextIndex
+
+listingIndex = FullTextIndex(Produce, ["name"])
+
+
+def ensureSearchIndex():
+    """Create the listing-name search index if needed (see FullTextIndex)."""
+    return listingIndex.ensure()
+
+
+def searchListings(query=None, min_price=None, max_price=None, min_quantity=None,
+                   since=None, cursor=None, limit=20):
+    """Public listings, newest first, paginated by (created_at, id).
+
+    Returns (listings, next_cursor). Keyset pagination means later pages cost
+    the same as the first; the cursor is opaque to clients.
+    """
+    listings = Produce.objects.all()
+    if query:
+        listings = listingIndex.filter(listings, query)
+        if listings is None:
+            return [], None
+    if min_price is not None:
+        listings = listings.filter(price__gte=min_price)
+    if max_price is not None:
+        listings = listings.filter(price__lte=max_price)
+    if min_quantity is not None:
+        listings = listings.filter(quantity__gte=min_quantity)
+    if since is not None:
+        listings = listings.filter(created_at__gte=since)
+    if cursor:
+        try:
+            created_at, last_id = decodeCursor(cursor, list)
+            created_at = datetime.datetime.fromisoformat(created_at)
+            last_id = int(last_id)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor") from None
+        # Written as a range on created_at (rather than an OR) so the index can seek to it
+        listings = listings.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=last_id)
+
+    page = list(listings.order_by("-created_at", "-id")[:limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encodeCursor([page[-1].created_at.isoformat(), page[-1].id])
+    return page, next_cursor
@@ -0,0 +1,169 @@
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+
+import joblib
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = getattr(settings, 'MODEL_DIR', 'model_code')
+# Registered name -> artifact base name; "<base>.joblib" is preferred over "<base>.pkl"
+MODEL_ARTIFACTS = getattr(settings, 'MODEL_ARTIFACTS', {
+    'crop': 'CropRecommend',
+    'fertilizer': 'Fertilizer',
+})
+# Registered name -> expected SHA-256 of the artifact; a "<artifact>.sha256" file next to it also works
+MODEL_CHECKSUMS = getattr(settings, 'MODEL_CHECKSUMS', {})
+
+
+class ModelUnavailable(Exception):
+    pass
+
+
+def fileChecksum(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def residentBytes():
+    """Current resident set size of this process, or None where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def arrayBytes(obj, _seen=None):
+    """(in_memory, memory_mapped) bytes of the NumPy arrays reachable from a model's attributes."""
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0, 0
+    seen.add(id(obj))
+    if isinstance(obj, np.memmap):
+        return 0, obj.nbytes
+    if isinstance(obj, np.ndarray):
+        if isinstance(obj.base, np.memmap):
+            return 0, obj.nbytes
+        return obj.nbytes, 0
+    if isinstance(obj, dict):
+        children = obj.values()
+    elif isinstance(obj, (list, tuple)):
+        children = obj
+    elif hasattr(obj, '__dict__'):
+        children = vars(obj).values()
+    else:
+        return 0, 0
+    in_memory = mapped = 0
+    for child in children:
+        child_memory, child_mapped = arrayBytes(child, seen)
+        in_memory += child_memory
+        mapped += child_mapped
+    return in_memory, mapped
+
+
+class _Entry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.model = None
+        self.stats = {}
+
+
+class ModelRegistry:
+    """Prediction models loaded on first use rather than at import.
+
+    Each model is read from "<base>.joblib" when present, memory-mapping its
+    NumPy arrays read-only so worker processes share those pages, and
+    otherwise from the legacy "<base>.pkl". Artifacts with a known SHA-256
+    (MODEL_CHECKSUMS or a ".sha256" file) are verified before loading.
+    Load time, file size and resident size are kept per model for stats().
+    """
+
+    def __init__(self, directory=MODEL_DIR, artifacts=None, checksums=None):
+        self.directory = directory
+        self.artifacts = dict(MODEL_ARTIFACTS if artifacts is None else artifacts)
+        self.checksums = dict(MODEL_CHECKSUMS if checksums is None else checksums)
+        self._entries = {name: _Entry() for name in self.artifacts}
+
+    def __contains__(self, name):
+        return name in self.artifacts
+
+    def resolve(self, name):
+        """Path and format ("joblib" or "pickle") of the artifact that would be loaded."""
+        base = os.path.join(self.directory, self.artifacts[name])
+        if os.path.exists(base + '.joblib'):
+            return base + '.joblib', 'joblib'
+        return base + '.pkl', 'pickle'
+
+    def expected_checksum(self, name, path):
+        if name in self.checksums:
+            return self.checksums[name]
+        try:
+            with open(path + '.sha256') as f:
+                return f.read().split()[0]
+        except (OSError, IndexError):
+            return None
+
+    def get(self, name):
+        """The loaded model; raises KeyError for unknown names and ModelUnavailable on load failure."""
+        entry = self._entries[name]
+        if entry.model is not None:
+            return entry.model
+        with entry.lock:
+            if entry.model is None:
+                entry.model = self._load(name, entry)
+        return entry.model
+
+    def _load(self, name, entry):
+        path, fmt = self.resolve(name)
+        entry.stats = {'path': path, 'format': fmt, 'loaded': False}
+        started = time.perf_counter()
+        rss_before = residentBytes()
+        try:
+            expected = self.expected_checksum(name, path)
+            if expected is not None:
+                actual = fileChecksum(path)
+                if actual != expected:
+                    raise ModelUnavailable(f"Checksum mismatch for {path}: expected {expected}, got {actual}")
+            if fmt == 'joblib':
+                model = joblib.load(path, mmap_mode='r')
+            else:
+                with open(path, 'rb') as f:
+                    model = pickle.load(f)
+        except Exception as e:
+            entry.stats['error'] = str(e)
+            logger.error(f"Failed to load model {name}: {str(e)}")
+            if isinstance(e, ModelUnavailable):
+                raise
+            raise ModelUnavailable(f"Model {name} could not be loaded: {e}") from e
+
+        rss_after = residentBytes()
+        in_memory, mapped = arrayBytes(model)
+        entry.stats.update(
+            loaded=True,
+            error=None,
+            checksum_verified=expected is not None,
+            load_ms=round((time.perf_counter() - started) * 1000, 2),
+            file_bytes=os.path.getsize(path),
+            array_bytes=in_memory,
+            mmapped_array_bytes=mapped,
+            resident_delta_bytes=rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+        )
+        return model
+
+    def stats(self):
+        report = {}
+        for name, entry in self._entries.items():
+            report[name] = dict(entry.stats) if entry.stats else {'loaded': False}
+        return report
+
+
+modelRegistry = ModelRegistry()
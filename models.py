@@ -1,10 +1,50 @@
 from django.db import models
+from django.db.models.functions import Lower
 from landing.models import User
 
 def getDetailsFromUID(id):
     obj = User.objects.get(id=id)
     return obj
 
+def loadFarmers(produces):
+    """Attach each listing's farmer using a single ``id IN (...)`` query."""
+    produces = [produce for produce in produces if isinstance(produce, Produce)]
+    farmerids = {produce.farmerid for produce in produces}
+    if not farmerids:
+        return
+    farmers = User.objects.in_bulk(farmerids)
+    for produce in produces:
+        if produce.farmerid in farmers:
+            produce._farmer = farmers[produce.farmerid]
+
+
+class ProduceQuerySet(models.QuerySet):
+    """Listings whose farmers can be loaded in bulk with ``with_farmers()``.
+
+    ``farmerid`` is a plain integer rather than a relation, so
+    ``select_related`` cannot follow it; instead the farmers of every fetched
+    listing are resolved with one extra query when the queryset is evaluated.
+    """
+
+    _with_farmers = False
+
+    def with_farmers(self):
+        clone = self._chain()
+        clone._with_farmers = True
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._with_farmers = self._with_farmers
+        return clone
+
+    def _fetch_all(self):
+        fetched = self._result_cache is None
+        super()._fetch_all()
+        if fetched and self._with_farmers:
+            loadFarmers(self._result_cache)
+
+
 # Create your models here.
 class Produce(models.Model):
     farmerid = models.IntegerField(default=0)
@@ -20,6 +60,120 @@ class Produce(models.Model):
     # Date and time of listing
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ProduceQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["farmerid", "-created_at", "-id"]),
+            models.Index(fields=["-created_at"]),
+        ]
+
     @property
     def user(self):
-        return getDetailsFromUID(self.farmerid)
\ No newline at end of file
+        # Set by ProduceQuerySet.with_farmers()
+        farmer = self.__dict__.get("_farmer")
+        if farmer is None or farmer.id != self.farmerid:
+            farmer = self._farmer = getDetailsFromUID(self.farmerid)
+        return farmer
+
+class ListingCounter(models.Model):
+    # Number of Produce listings per farmer, kept up to date by listings.py;
+    # the row with farmerid ALL_FARMERS counts every listing
+    ALL_FARMERS = -1
+
+    farmerid = models.IntegerField(unique=True)
+    count = models.BigIntegerField(default=0)
+
+class MarketPrice(models.Model):
+    # One mandi price report from data.gov.in, kept for trend analysis
+    state = models.CharField(max_length=100)
+    district = models.CharField(max_length=100)
+    market = models.CharField(max_length=150)
+    commodity = models.CharField(max_length=150)
+    variety = models.CharField(max_length=150, blank=True, default="")
+    grade = models.CharField(max_length=100, blank=True, default="")
+    arrival_date = models.DateField()
+
+    min_price = models.FloatField(help_text="Minimum price per quintal")
+    max_price = models.FloatField(help_text="Maximum price per quintal")
+    modal_price = models.FloatField(help_text="Modal price per quintal")
+
+    fetched_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["state", "district", "market", "commodity", "variety", "grade", "arrival_date"],
+                name="unique_market_price_report",
+            ),
+        ]
+        # Trend lookups are case-insensitive, so they go through lower() expression indexes
+        indexes = [
+            models.Index(Lower("commodity"), Lower("market"), "arrival_date", name="marketprice_commodity_market"),
+            models.Index(fields=["state", "arrival_date"]),
+        ]
+
+
+class ChatConversation(models.Model):
+    # One chatbot conversation; the session only keeps its id
+    farmerid = models.IntegerField(db_index=True)
+    # ConversationMemory summary of every turn up to and including summarized_through_id
+    summary = models.JSONField(default=dict, blank=True)
+    summarized_through_id = models.BigIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class ChatTurn(models.Model):
+    # Append-only log of chatbot messages, one row per message
+    conversation = models.ForeignKey(ChatConversation, on_delete=models.CASCADE, related_name="turns")
+    role = models.CharField(max_length=20)
+    text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["conversation", "-id"]),
+        ]
+
+class NewsArticle(models.Model):
+    # Agriculture news from NewsAPI, one row per article URL
+    url_hash = models.CharField(max_length=40, unique=True, help_text="SHA-1 of the article URL")
+    url = models.URLField(max_length=2000)
+    title = models.CharField(max_length=500)
+    description = models.TextField(blank=True, default="")
+    content = models.TextField(blank=True, default="")
+    author = models.CharField(max_length=255, blank=True, default="")
+    source_name = models.CharField(max_length=255, blank=True, default="")
+
+    # Thumbnail metadata; the image itself is not downloaded
+    image_url = models.URLField(max_length=2000, blank=True, default="")
+
+    published_at = models.DateTimeField()
+    fetched_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-published_at", "-id"]),
+        ]
+
+    def as_article(self):
+        """The article in NewsAPI's shape, as the news templates expect."""
+        return {
+            "source": {"id": None, "name": self.source_name},
+            "author": self.author or None,
+            "title": self.title,
+            "description": self.description or None,
+            "url": self.url,
+            "urlToImage": self.image_url or None,
+            "publishedAt": self.published_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "content": self.content or None,
+        }
+
+
+class NewsSyncCursor(models.Model):
+    # The publish-time window news ingestion still has to read (one row, see
+    # news.ingestNewsArticles); kept in the database so it survives cache eviction
+    since = models.DateTimeField()
+    until = models.DateTimeField(null=True, blank=True)
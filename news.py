@@ -0,0 +1,108 @@
+import datetime
+import hashlib
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .functions import NEWS_PAGE_SIZE, getAgroNews
+from .models import NewsArticle, NewsSyncCursor
+from .search_index import FullTextIndex
+
+NEWS_MAX_PAGES = getattr(settings, 'NEWS_MAX_PAGES', 5)
+NEWS_RETENTION_DAYS = getattr(settings, 'NEWS_RETENTION_DAYS', 60)
+
+newsIndex = FullTextIndex(NewsArticle, ["title", "description"])
+
+
+def urlHash(url):
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def toNewsArticle(article):
+    """NewsArticle for one NewsAPI article, or None if it lacks a URL, title or date."""
+    url = article.get("url") or ""
+    published_at = parse_datetime(article.get("publishedAt") or "")
+    if not url or not article.get("title") or published_at is None:
+        return None
+    if timezone.is_naive(published_at):
+        published_at = timezone.make_aware(published_at, datetime.timezone.utc)
+    field = NewsArticle._meta.get_field
+    return NewsArticle(
+        url_hash=urlHash(url),
+        url=url[:field("url").max_length],
+        title=article["title"][:field("title").max_length],
+        description=article.get("description") or "",
+        content=article.get("content") or "",
+        author=(article.get("author") or "")[:field("author").max_length],
+        source_name=((article.get("source") or {}).get("name") or "")[:field("source_name").max_length],
+        image_url=(article.get("urlToImage") or "")[:field("image_url").max_length],
+        published_at=published_at,
+    )
+
+
+def isoTime(value):
+    return value.astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def ingestNewsArticles(max_pages=NEWS_MAX_PAGES, page_size=NEWS_PAGE_SIZE):
+    """Fetch articles published since the last complete run and store them.
+
+    Each run reads at most max_pages pages, newest first. When the new
+    articles do not fit, the run stores what it read and remembers the
+    oldest publish time it reached (NewsSyncCursor); the next runs carry
+    on below it until the backlog is empty, and only then does the cursor
+    move up to the newest stored article. URL hashes dedupe articles across
+    runs and syndicated copies. Returns the number of new articles; raises
+    RuntimeError if a page cannot be fetched, storing nothing.
+    """
+    cursor = NewsSyncCursor.objects.first()
+    if cursor is None:
+        newest = NewsArticle.objects.order_by("-published_at", "-id").values_list("published_at", flat=True).first()
+        # Anything older than the retention period would be pruned at once
+        cursor = NewsSyncCursor(since=newest or timezone.now() - datetime.timedelta(days=NEWS_RETENTION_DAYS))
+    since, until = isoTime(cursor.since), cursor.until and isoTime(cursor.until)
+
+    articles = {}
+    oldest = None
+    complete = False
+    for page in range(1, max_pages + 1):
+        fetched = getAgroNews(since=since, until=until, page=page, page_size=page_size)
+        if fetched is None:
+            raise RuntimeError(f"News fetch failed on page {page}")
+        batch = [article for article in map(toNewsArticle, fetched) if article]
+        hashes = {article.url_hash for article in batch}
+        known = set(NewsArticle.objects.filter(url_hash__in=hashes).values_list("url_hash", flat=True))
+        for article in batch:
+            if oldest is None or article.published_at < oldest:
+                oldest = article.published_at
+            if article.url_hash not in known:
+                articles.setdefault(article.url_hash, article)
+        if len(fetched) < page_size:
+            complete = True
+            break
+
+    with transaction.atomic():
+        NewsArticle.objects.bulk_create(articles.values(), ignore_conflicts=True)
+        NewsArticle.objects.filter(
+            published_at__lt=timezone.now() - datetime.timedelta(days=NEWS_RETENTION_DAYS)
+        ).delete()
+        if complete:
+            newest = NewsArticle.objects.order_by("-published_at", "-id").values_list("published_at", flat=True).first()
+            cursor.since, cursor.until = newest or cursor.since, None
+        elif oldest is not None:
+            # The bound is inclusive, so articles at `oldest` are read again and deduped
+            cursor.until = oldest
+        cursor.save()
+    return len(articles)
+
+
+def getLatestNews(limit=20, keyword=None):
+    """Latest stored articles (NewsAPI dicts), optionally matching keyword in title or description."""
+    articles = NewsArticle.objects.all()
+    if keyword:
+        articles = newsIndex.filter(articles, keyword)
+        if articles is None:
+            return []
+    return [article.as_article() for article in articles.order_by("-published_at", "-id")[:limit]]
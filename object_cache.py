@@ -0,0 +1,303 @@
+import logging
+import math
+import pickle
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Any, NamedTuple
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.core.cache import cache as shared_cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Produce, User
+
+logger = logging.getLogger(__name__)
+
+LOCAL_CACHE_SIZE = getattr(settings, 'DASHBOARD_LOCAL_CACHE_SIZE', 1024)
+LOCAL_CACHE_TTL = getattr(settings, 'DASHBOARD_LOCAL_CACHE_TTL', 5)
+# When the ingest_feeds worker keeps external feeds fresh, requests only read them
+FEEDS_WORKER = getattr(settings, 'DASHBOARD_FEEDS_WORKER', False)
+
+# Distinguishes a cached None from a miss
+_MISSING = object()
+
+
+def keyPrefix(key):
+    """Metrics group for a key: "user_42" -> "user", "weather_cell_12.95_77.6" -> "weather_cell"."""
+    parts = key.split("_")
+    while len(parts) > 1 and parts[-1].lstrip("-").replace(".", "", 1).isdigit():
+        parts.pop()
+    return "_".join(parts)
+
+
+class TieredCache:
+    """Two-level cache: a small per-process LRU in front of the shared Django cache.
+
+    Reads try the local LRU, then the shared store (filling the LRU); writes
+    and deletes go to both. Local entries live at most `local_ttl` seconds,
+    which bounds how stale one worker can be after another worker
+    invalidates a key. Hits and misses are counted per key prefix.
+    """
+
+    def __init__(self, shared=None, local_size=LOCAL_CACHE_SIZE, local_ttl=LOCAL_CACHE_TTL):
+        self.shared = shared if shared is not None else shared_cache
+        self.local_ttl = local_ttl
+        self._local = TTLCache(maxsize=local_size, ttl=local_ttl) if local_size and local_ttl else None
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: defaultdict(int))
+        self._timing = defaultdict(float)
+
+    def _count(self, key, event, count=1):
+        with self._lock:
+            self._stats[keyPrefix(key)][event] += count
+
+    # Local entries are kept pickled, like the shared store keeps them, so every
+    # caller gets its own copy and mutating a cached object cannot leak between requests
+    def _local_get(self, key):
+        if self._local is None:
+            return _MISSING
+        with self._lock:
+            data = self._local.get(key, _MISSING)
+        return data if data is _MISSING else pickle.loads(data)
+
+    def _local_set(self, key, value):
+        if self._local is not None:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            with self._lock:
+                self._local[key] = data
+
+    def get(self, key, default=None):
+        value = self._local_get(key)
+        if value is not _MISSING:
+            self._count(key, "local_hits")
+            return value
+        started = time.perf_counter()
+        value = self.shared.get(key, _MISSING)
+        with self._lock:
+            self._timing[keyPrefix(key)] += time.perf_counter() - started
+        if value is _MISSING:
+            self._count(key, "misses")
+            return default
+        self._count(key, "shared_hits")
+        self._local_set(key, value)
+        return value
+
+    def set(self, key, value, timeout=None):
+        self.shared.set(key, value, timeout=timeout)
+        self._local_set(key, value)
+        self._count(key, "sets")
+
+    def delete(self, key):
+        self.shared.delete(key)
+        if self._local is not None:
+            with self._lock:
+                self._local.pop(key, None)
+        self._count(key, "invalidations")
+
+    def clear_local(self):
+        if self._local is not None:
+            with self._lock:
+                self._local.clear()
+
+    def stats(self):
+        with self._lock:
+            report = {}
+            for prefix, counts in self._stats.items():
+                lookups = counts["local_hits"] + counts["shared_hits"] + counts["misses"]
+                report[prefix] = {
+                    **counts,
+                    "hit_rate": round((counts["local_hits"] + counts["shared_hits"]) / lookups, 4) if lookups else 0.0,
+                    "shared_read_ms": round(self._timing[prefix] * 1000, 3),
+                }
+            report["_local"] = {
+                "entries": len(self._local) if self._local is not None else 0,
+                "maxsize": self._local.maxsize if self._local is not None else 0,
+                "ttl": self.local_ttl,
+            }
+            return report
+
+
+objectCache = TieredCache()
+
+
+# Single-flight get-or-compute -------------------------------------------------
+
+COMPUTE_WAIT = 20  # seconds a caller waits for another caller's computation
+COMPUTE_LOCK_TIMEOUT = 300  # upper bound on one computation holding the cross-worker lock
+COMPUTE_POLL_INTERVAL = 0.05
+
+
+class CachedValue(NamedTuple):
+    value: Any
+    expires: float  # wall-clock time after which the value is stale
+    delta: float  # seconds the last computation took
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _sharedStore(store):
+    # Locks and double-checks must bypass the per-process LRU
+    return getattr(store, "shared", store)
+
+
+def _isDue(entry, now, beta):
+    """XFetch: refresh early with a probability that rises as expiry nears,
+    scaled by how long the value takes to compute."""
+    return now - entry.delta * beta * math.log(1.0 - random.random()) >= entry.expires
+
+
+def _lookup(store, key):
+    entry = store.get(key)
+    # Values cached before get-or-compute existed are treated as missing
+    return entry if isinstance(entry, CachedValue) else None
+
+
+def refreshCached(key, compute, timeout, stale_timeout=None, cache=None):
+    """Compute a value now and store it for getOrCompute(). Returns the value.
+
+    None is never cached, so a failed upstream call leaves any previous value
+    in place.
+    """
+    store = cache if cache is not None else objectCache
+    stale_timeout = timeout if stale_timeout is None else stale_timeout
+    started = time.monotonic()
+    value = compute()
+    if value is not None:
+        entry = CachedValue(value, time.time() + timeout, time.monotonic() - started)
+        store.set(key, entry, timeout=timeout + stale_timeout)
+    return value
+
+
+def getOrCompute(key, compute, timeout, stale_timeout=None, beta=1.0, background=False,
+                 wait=COMPUTE_WAIT, cache=None, read_only=False):
+    """Cached value for `key`, computed by at most one caller at a time.
+
+    A value is fresh for `timeout` seconds and then served stale for up to
+    `stale_timeout` more while it is recomputed. Recomputation may start
+    early, before `timeout`, with a probability that grows near expiry
+    (`beta` > 1 favours earlier refreshes, 0 disables them), so busy keys
+    rarely expire at all.
+
+    Only one caller per key recomputes within a process; the others wait
+    for it (or take the stale value). Across workers a lock taken with
+    cache.add() does the same, which is only atomic on backends such as
+    Redis or Memcached. FileBasedCache and LocMemCache do not guarantee
+    it between processes, so with those each process may compute once.
+    With `background=True` the computation
+    runs in a thread and the caller gets the stale value or None at once.
+    With `read_only=True` the cached value, fresh or stale, is returned as is
+    and nothing is computed.
+    """
+    store = cache if cache is not None else objectCache
+    stale_timeout = timeout if stale_timeout is None else stale_timeout
+    entry = _lookup(store, key)
+    if read_only:
+        return entry.value if entry is not None else None
+    if entry is not None and not _isDue(entry, time.time(), beta):
+        return entry.value
+    stale = entry.value if entry is not None else None
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    if not leader:
+        if entry is not None or background:
+            return stale
+        flight.done.wait(wait)
+        return flight.value
+
+    shared = _sharedStore(store)
+    lock_key = f"{key}:computing"
+    result = stale
+    try:
+        if not shared.add(lock_key, True, timeout=COMPUTE_LOCK_TIMEOUT):
+            # Another worker is computing (best effort unless add() is atomic, see
+            # the docstring); wait for its value only on a cold miss
+            if entry is None and not background:
+                deadline = time.monotonic() + wait
+                while result is None and time.monotonic() < deadline:
+                    time.sleep(COMPUTE_POLL_INTERVAL)
+                    current = _lookup(shared, key)
+                    result = current.value if current is not None else None
+            return result
+
+        # Another worker may have finished just before we took the lock
+        current = _lookup(shared, key)
+        if current is not None and current.expires > time.time():
+            shared.delete(lock_key)
+            result = current.value
+            return result
+
+        def run():
+            try:
+                return refreshCached(key, compute, timeout, stale_timeout, store)
+            finally:
+                shared.delete(lock_key)
+
+        if background:
+            def run_in_background():
+                try:
+                    run()
+                except Exception as e:
+                    logger.error(f"Background refresh of {key} failed: {str(e)}")
+
+            threading.Thread(target=run_in_background, name=f"refresh-{key}", daemon=True).start()
+            return result
+        try:
+            value = run()
+        except Exception as e:
+            if entry is None:
+                raise
+            logger.error(f"Refresh of {key} failed, serving the stale value: {str(e)}")
+            return result
+        result = value if value is not None else stale
+        return result
+    finally:
+        flight.value = result
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+def userCacheKey(userid):
+    return f"user_{userid}"
+
+
+def listingSummaryCacheKey(farmerid):
+    return f"listing_summary_{farmerid}"
+
+
+# Invalidate once the change is committed, so no request can re-cache the old rows
+def invalidateUser(userid):
+    transaction.on_commit(lambda: objectCache.delete(userCacheKey(userid)))
+
+
+def invalidateListings(farmerid):
+    transaction.on_commit(lambda: objectCache.delete(listingSummaryCacheKey(farmerid)))
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidateUserOnChange(sender, instance, **kwargs):
+    invalidateUser(instance.id)
+
+
+@receiver(post_save, sender=Produce)
+def invalidateListingsOnChange(sender, instance, created, raw=False, **kwargs):
+    # Creates and deletes go through listings.adjustListingCounts, which invalidates
+    if not created and not raw:
+        invalidateListings(instance.farmerid)
@@ -0,0 +1,299 @@
+import base64
+import bisect
+import datetime
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Lower
+
+from .functions import getMarketPricesAllStates
+from .models import MarketPrice
+from .object_cache import FEEDS_WORKER, getOrCompute, refreshCached
+
+logger = logging.getLogger(__name__)
+
+MARKET_PRICES_CACHE_KEY = 'market_prices'
+MARKET_PRICES_VERSION_KEY = 'market_prices_version'
+# Refresh in the background once the data is this old, keep serving it until MAX_AGE
+MARKET_PRICES_REFRESH_AFTER = getattr(settings, 'MARKET_PRICES_REFRESH_AFTER', 3000)
+MARKET_PRICES_MAX_AGE = getattr(settings, 'MARKET_PRICES_MAX_AGE', 86400)
+
+
+PRICE_SORT_FIELDS = ('arrival_date', 'modal_price', 'min_price', 'max_price', 'commodity', 'state', 'district', 'market')
+
+
+def parseArrivalDate(value):
+    # data.gov.in reports arrival dates as dd/mm/yyyy
+    try:
+        return datetime.datetime.strptime(str(value), '%d/%m/%Y').date()
+    except ValueError:
+        return None
+
+
+def _price(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def encodeCursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decodeCursor(cursor, shape=dict, keys=()):
+    """Decode a cursor from encodeCursor(), checking it is a `shape` (dict or
+    list) holding `keys`. Raises ValueError for anything else."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor") from None
+    if not isinstance(values, shape) or any(key not in values for key in keys):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+class MarketPriceIndex:
+    """Read-only view over one fetch of all-states market prices, indexed by
+    state, district, commodity, market and arrival date."""
+
+    def __init__(self, records=(), fetched_at=None):
+        self.records = tuple(records)
+        self.fetched_at = fetched_at
+        self.by_state = defaultdict(list)
+        self.by_district = defaultdict(list)
+        self.by_commodity = defaultdict(list)
+        self.by_market = defaultdict(list)
+        self.arrival_dates = []
+        for position, record in enumerate(self.records):
+            self.by_state[str(record.get('state', '')).lower()].append(position)
+            self.by_district[str(record.get('district', '')).lower()].append(position)
+            self.by_commodity[str(record.get('commodity', '')).lower()].append(position)
+            self.by_market[str(record.get('market', '')).lower()].append(position)
+            arrival = parseArrivalDate(record.get('arrival_date'))
+            self.arrival_dates.append(arrival.toordinal() if arrival else 0)
+        # Positions ordered by arrival date, for range lookups by bisection
+        self.by_arrival = sorted(range(len(self.records)), key=self.arrival_dates.__getitem__)
+        self._sorted_arrivals = [self.arrival_dates[position] for position in self.by_arrival]
+
+    def _candidates(self, state=None, district=None, commodity=None, market=None, since=None, until=None):
+        sets = []
+        for index, value in ((self.by_state, state), (self.by_district, district),
+                             (self.by_commodity, commodity), (self.by_market, market)):
+            if value:
+                sets.append(index.get(value.lower(), ()))
+        if since or until:
+            # Unparseable dates (ordinal 0) sort first and never match a date bound
+            low = bisect.bisect_left(self._sorted_arrivals, since.toordinal() if since else 1)
+            high = bisect.bisect_right(self._sorted_arrivals, until.toordinal()) if until else len(self.by_arrival)
+            sets.append(self.by_arrival[low:high])
+        if not sets:
+            return range(len(self.records))
+        # Intersect starting from the most selective index
+        sets.sort(key=len)
+        selected = set(sets[0])
+        for positions in sets[1:]:
+            selected.intersection_update(positions)
+        return selected
+
+    def filter(self, state=None, commodity=None, market=None):
+        if not (state or commodity or market):
+            return list(self.records)
+        positions = self._candidates(state=state, commodity=commodity, market=market)
+        return [self.records[position] for position in sorted(positions)]
+
+    def _sort_key(self, field):
+        if field == 'arrival_date':
+            return self.arrival_dates.__getitem__
+        if field.endswith('_price'):
+            return lambda position: _price(self.records[position].get(field))
+        return lambda position: str(self.records[position].get(field, '')).lower()
+
+    def query(self, sort='-arrival_date', cursor=None, limit=50, **filters):
+        """Filter, sort and page through the records.
+
+        Returns (records, total, next_cursor). Cursors carry the sort value and
+        position of the last record returned and are only valid for the same
+        fetch of the data.
+        """
+        field = sort.lstrip('-')
+        if field not in PRICE_SORT_FIELDS:
+            raise ValueError(f"Cannot sort by {field}")
+        descending = sort.startswith('-')
+        value_of = self._sort_key(field)
+        matched = sorted(
+            ((value_of(position), position) for position in self._candidates(**filters)),
+            reverse=descending,
+        )
+        start = 0
+        if cursor:
+            after = decodeCursor(cursor, dict, keys=('v', 's', 'k', 'p'))
+            if after['v'] != self.fetched_at or after['s'] != sort:
+                raise ValueError("Cursor has expired")
+            last = (after['k'], after['p'])
+            try:
+                if descending:
+                    # Find the first entry strictly "after" last in descending order
+                    start = len(matched) - bisect.bisect_left(matched[::-1], last)
+                else:
+                    start = bisect.bisect_right(matched, last)
+            except TypeError:
+                # k or p of the wrong type for this sort field
+                raise ValueError("Invalid cursor") from None
+        page = matched[start:start + limit]
+        next_cursor = None
+        if start + limit < len(matched) and page:
+            key, position = page[-1]
+            next_cursor = encodeCursor({'v': self.fetched_at, 's': sort, 'k': key, 'p': position})
+        return [self.records[position] for _, position in page], len(matched), next_cursor
+
+
+_index = MarketPriceIndex()
+_index_lock = threading.Lock()
+
+
+def _publishRecords(records):
+    """Publish fetched records as the shared dataset. Returns its version (the fetch time)."""
+    try:
+        storeMarketPriceHistory(records)
+    except Exception as e:
+        logger.error(f"Market price history ingestion failed: {str(e)}")
+    fetched_at = time.time()
+    cache.set(MARKET_PRICES_CACHE_KEY, {'records': records, 'fetched_at': fetched_at}, timeout=MARKET_PRICES_MAX_AGE)
+    return fetched_at
+
+
+def _fetchMarketPrices():
+    # States that fail this time keep the records last published for them
+    entry = cache.get(MARKET_PRICES_CACHE_KEY)
+    records = getMarketPricesAllStates(previous=entry['records'] if entry else None)
+    if not records:
+        logger.warning("Market price refresh returned no records, keeping previous data")
+    return records
+
+
+def _publishMarketPrices():
+    """Fetch all states and publish them as the shared dataset.
+
+    Returns the new dataset version (its fetch time), or None when the fetch
+    came back empty and the previous data should stay.
+    """
+    records = _fetchMarketPrices()
+    return _publishRecords(records) if records else None
+
+
+# The version key is fresh for REFRESH_AFTER seconds and served stale until MAX_AGE
+MARKET_PRICES_FRESHNESS = {
+    'timeout': MARKET_PRICES_REFRESH_AFTER,
+    'stale_timeout': max(MARKET_PRICES_MAX_AGE - MARKET_PRICES_REFRESH_AFTER, 0),
+    'cache': cache,
+}
+
+
+def refreshMarketPrices():
+    """Fetch and publish market prices now. Returns the number of records published
+    (0 when the fetch came back empty and the previous data stays)."""
+    records = _fetchMarketPrices()
+    if records:
+        refreshCached(MARKET_PRICES_VERSION_KEY, lambda: _publishRecords(records), **MARKET_PRICES_FRESHNESS)
+    return len(records)
+
+
+def getMarketPriceIndex():
+    """Return the current shared price index without ever waiting on data.gov.in.
+
+    The full dataset is only read from the cache when its version changes.
+    Refreshes run in a background thread of whichever worker claims them
+    first, while every worker keeps serving the data it has.
+    """
+    global _index
+    version = getOrCompute(MARKET_PRICES_VERSION_KEY, _publishMarketPrices, background=True,
+                           read_only=FEEDS_WORKER, **MARKET_PRICES_FRESHNESS)
+    if version is not None and version != _index.fetched_at:
+        entry = cache.get(MARKET_PRICES_CACHE_KEY)
+        if entry is not None:
+            index = MarketPriceIndex(entry['records'], entry['fetched_at'])
+            with _index_lock:
+                _index = index
+        else:
+            # The dataset was evicted; drop its version so the next refresh refetches
+            cache.delete(MARKET_PRICES_VERSION_KEY)
+    return _index
+
+
+TREND_FREQUENCIES = {'day': 'D', 'week': 'W', 'month': 'MS'}
+
+
+def storeMarketPriceHistory(records, batch_size=500):
+    """Append fetched records to the MarketPrice history table.
+
+    Reports already stored (same market, commodity, variety, grade and
+    arrival date) are skipped by the unique constraint. Returns the number of
+    rows offered for insertion.
+    """
+    rows = []
+    for record in records:
+        arrival = parseArrivalDate(record.get('arrival_date'))
+        if arrival is None:
+            continue
+        rows.append(MarketPrice(
+            state=record.get('state', ''),
+            district=record.get('district', ''),
+            market=record.get('market', ''),
+            commodity=record.get('commodity', ''),
+            variety=record.get('variety') or '',
+            grade=record.get('grade') or '',
+            arrival_date=arrival,
+            min_price=_price(record.get('min_price')),
+            max_price=_price(record.get('max_price')),
+            modal_price=_price(record.get('modal_price')),
+        ))
+    with transaction.atomic():
+        MarketPrice.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+    return len(rows)
+
+
+def getPriceTrends(commodity, market=None, state=None, since=None, until=None, period='day'):
+    """Min/max/modal price per period and market for one commodity.
+
+    Names match case-insensitively. The lookups compare lower() on both
+    sides, as the (lower(commodity), lower(market), arrival_date) index
+    does; iexact would compile to LIKE on SQLite and scan the table. Only
+    the needed columns are read and aggregated in one vectorized groupby.
+    """
+    if period not in TREND_FREQUENCIES:
+        raise ValueError(f"Unknown period: {period}")
+    queryset = MarketPrice.objects.alias(commodity_key=Lower('commodity')).filter(
+        commodity_key=Lower(Value(commodity))
+    )
+    if market:
+        queryset = queryset.alias(market_key=Lower('market')).filter(market_key=Lower(Value(market)))
+    if state:
+        queryset = queryset.alias(state_key=Lower('state')).filter(state_key=Lower(Value(state)))
+    if since:
+        queryset = queryset.filter(arrival_date__gte=since)
+    if until:
+        queryset = queryset.filter(arrival_date__lte=until)
+    columns = ['market', 'arrival_date', 'min_price', 'max_price', 'modal_price']
+    frame = pd.DataFrame.from_records(queryset.values_list(*columns).iterator(chunk_size=5000), columns=columns)
+    if frame.empty:
+        return []
+    frame['arrival_date'] = pd.to_datetime(frame['arrival_date'])
+    trends = (
+        frame.groupby(['market', pd.Grouper(key='arrival_date', freq=TREND_FREQUENCIES[period])])
+        .agg(min_price=('min_price', 'min'), max_price=('max_price', 'max'),
+             modal_price=('modal_price', 'median'), reports=('modal_price', 'size'))
+        .reset_index()
+    )
+    trends = trends[trends['reports'] > 0]
+    trends['arrival_date'] = trends['arrival_date'].dt.date.astype(str)
+    trends['modal_price'] = trends['modal_price'].round(2)
+    return trends.rename(columns={'arrival_date': 'period'}).to_dict('records')
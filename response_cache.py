@@ -0,0 +1,153 @@
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+NUMBER = re.compile(r"\d+(?:\.\d+)?")
+NON_WORD = re.compile(r"[^\w\s.]+")
+SPACES = re.compile(r"\s+")
+
+
+def normalizeQuery(query):
+    query = NON_WORD.sub(" ", query.lower())
+    return SPACES.sub(" ", query).strip(" .")
+
+
+def contextKey(context):
+    return hashlib.sha1(json.dumps(context or {}, sort_keys=True).encode()).hexdigest()
+
+
+STOPWORDS = frozenset("""
+a an the of for on in at to by with and or is are was be do does did can could should would will
+i me my we our you your it this that what which how much many when where why please tell give use
+apply need want per about
+""".split())
+
+
+def termVector(text):
+    # Content-word counts (plural "s" stripped) with their L2 norm
+    terms = [
+        word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+        for word in text.split() if word not in STOPWORDS
+    ]
+    counts = Counter(terms)
+    return counts, math.sqrt(sum(c * c for c in counts.values()))
+
+
+def cosine(a, b):
+    (counts_a, norm_a), (counts_b, norm_b) = a, b
+    if not norm_a or not norm_b:
+        return 0.0
+    if len(counts_a) > len(counts_b):
+        counts_a, counts_b = counts_b, counts_a
+    return sum(c * counts_b.get(term, 0) for term, c in counts_a.items()) / (norm_a * norm_b)
+
+
+class _Entry:
+    __slots__ = ("context", "numbers", "vector", "response", "latency", "expires")
+
+    def __init__(self, context, numbers, vector, response, latency, expires):
+        self.context = context
+        self.numbers = numbers
+        self.vector = vector
+        self.response = response
+        self.latency = latency
+        self.expires = expires
+
+
+class ResponseCache:
+    """Cache of structured chatbot replies keyed by normalized question and farm context.
+
+    A lookup first tries the exact normalized question, then the most similar
+    cached question for the same context (cosine over content words at or
+    above `threshold`). Numbers must match exactly, so "2 acres" never
+    answers "5 acres". Entries expire after `ttl` seconds and the least
+    recently used ones are evicted beyond `max_entries`.
+    """
+
+    def __init__(self, max_entries=1024, ttl=86400, threshold=0.85):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()
+        self._by_context = {}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        keys = self._by_context[entry.context]
+        keys.discard(key)
+        if not keys:
+            del self._by_context[entry.context]
+
+    def _hit(self, key, entry, exact):
+        self._entries.move_to_end(key)
+        if exact:
+            self.exact_hits += 1
+        else:
+            self.near_hits += 1
+        self.saved_seconds += entry.latency
+        return entry.response
+
+    def get(self, query, context=None):
+        text = normalizeQuery(query)
+        ctx = contextKey(context)
+        key = (ctx, text)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires > now:
+                    return self._hit(key, entry, exact=True)
+                self._remove(key)
+
+            numbers = tuple(NUMBER.findall(text))
+            vector = termVector(text)
+            best_key, best_score = None, self.threshold
+            for candidate_key in list(self._by_context.get(ctx, ())):
+                candidate = self._entries[candidate_key]
+                if candidate.expires <= now:
+                    self._remove(candidate_key)
+                    continue
+                if candidate.numbers != numbers:
+                    continue
+                score = cosine(vector, candidate.vector)
+                if score >= best_score:
+                    best_key, best_score = candidate_key, score
+            if best_key is not None:
+                return self._hit(best_key, self._entries[best_key], exact=False)
+            self.misses += 1
+            return None
+
+    def put(self, query, context, response, latency=0.0):
+        text = normalizeQuery(query)
+        ctx = contextKey(context)
+        key = (ctx, text)
+        entry = _Entry(ctx, tuple(NUMBER.findall(text)), termVector(text), response, latency,
+                       time.monotonic() + self.ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._by_context.setdefault(ctx, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.near_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.exact_hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+            }
@@ -0,0 +1,107 @@
+import re
+import threading
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+SEARCH_TERM = re.compile(r"\w+")
+MAX_SEARCH_TERMS = 8
+
+
+def toMatchExpression(query):
+    """FTS5 query for free text: every word must match, the last one as a prefix."""
+    terms = SEARCH_TERM.findall(query.lower())[:MAX_SEARCH_TERMS]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+class FullTextIndex:
+    """SQLite FTS5 index over text columns of a model.
+
+    The index is an external-content table, so it stores only the tokens;
+    triggers keep it in step with inserts, updates and deletes (including
+    bulk_create). It is created after migrate or on first use and filled
+    from existing rows once. On databases without FTS5, filter() falls back
+    to a substring match on every column.
+    """
+
+    def __init__(self, model, columns):
+        self.model = model
+        self.columns = list(columns)
+        self.table = f"{model._meta.db_table}_fts"
+        self._ready = False
+        self._lock = threading.Lock()
+        _indexes.append(self)
+
+    def ensure(self):
+        """Create the index if needed. Returns False where FTS5 is unavailable."""
+        if self._ready:
+            return True
+        if connection.vendor != "sqlite":
+            return False
+        with self._lock:
+            if self._ready:
+                return True
+            source, fts = self.model._meta.db_table, self.table
+            columns = ", ".join(self.columns)
+            new = ", ".join(f"new.{column}" for column in self.columns)
+            old = ", ".join(f"old.{column}" for column in self.columns)
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [fts])
+                created = cursor.fetchone() is None
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                    f"{columns}, content='{source}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+                )
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {source} BEGIN "
+                    f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new}); END"
+                )
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {source} BEGIN "
+                    f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old}); END"
+                )
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {columns} ON {source} BEGIN "
+                    f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old}); "
+                    f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new}); END"
+                )
+                if created:
+                    # Index the rows that existed before the triggers
+                    cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+            self._ready = True
+        return True
+
+    def filter(self, queryset, query):
+        """Narrow queryset to rows matching every word of query (None if it has no words)."""
+        match = toMatchExpression(query)
+        if match is None:
+            return None
+        if self.ensure():
+            return queryset.filter(id__in=RawSQL(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s", [match]
+            ))
+        for term in SEARCH_TERM.findall(query)[:MAX_SEARCH_TERMS]:
+            condition = Q()
+            for column in self.columns:
+                condition |= Q(**{f"{column}__icontains": term})
+            queryset = queryset.filter(condition)
+        return queryset
+
+
+_indexes = []
+
+
+@receiver(post_migrate)
+def createSearchIndexes(sender, using="default", **kwargs):
+    if sender.name == "dashboard" and using == "default":
+        for index in _indexes:
+            # The test runner recreates the database, so check again
+            index._ready = False
+            index.ensure()
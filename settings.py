@@ -58,6 +58,9 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'ArogyaKheti.wsgi.application'
+ASGI_APPLICATION = 'ArogyaKheti.asgi.application'
+# Route dashboard views that call external services to their async variants (run under ASGI)
+DASHBOARD_ASYNC_VIEWS = os.environ.get("DASHBOARD_ASYNC_VIEWS", "False") == "True"
 if not DEBUG:
     raise RuntimeError("This project is not intended for deployment")
 
@@ -68,6 +71,31 @@ DATABASES = {
     }
 }
 
+# Cache shared by every worker process: Redis when REDIS_URL is set, otherwise
+# a file-based cache on local disk. The dashboard keeps a small in-process LRU
+# in front of it (see dashboard/object_cache.py).
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / os.environ.get('CACHE_DIR', '.django_cache'),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+DASHBOARD_LOCAL_CACHE_SIZE = int(os.environ.get('DASHBOARD_LOCAL_CACHE_SIZE', 1024))
+# Bounds how long one worker can serve an entry another worker has invalidated
+DASHBOARD_LOCAL_CACHE_TTL = int(os.environ.get('DASHBOARD_LOCAL_CACHE_TTL', 5))
+# Set when `manage.py ingest_feeds` is running: views then serve news, prices and
+# weather from the cache only and never call the upstream APIs themselves
+DASHBOARD_FEEDS_WORKER = os.environ.get('DASHBOARD_FEEDS_WORKER', 'False') == 'True'
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -1,3 +1,955 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+import joblib
+import numpy as np
+import pandas as pd
+import requests
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.utils import timezone
+from sklearn.preprocessing import LabelEncoder
+from urllib3.util.retry import RequestHistory
+
+from . import functions, model_registry, news, views
+from .carbon import estimateEmissions
+from .chat_store import SESSION_KEY, getChatlog, getConversation, loadHistoryState, recordTurn
+from .chatbot import CHATBOT_HISTORY_MESSAGES, ChatbotEngine, ConversationMemory, IncrementalJsonFields
+from .functions import getMarketPricesAllStates, getMarketPricesForState
+from .http_client import CircuitOpenError, UpstreamClient
+from .inference import MicroBatcher, buildFeatureMatrix
+from .listings import EXPORT_FIELDS, getListingSummary
+from .marketplace import searchListings
+from .model_registry import ModelRegistry, ModelUnavailable, fileChecksum
+from .models import ChatConversation, ChatTurn, ListingCounter, MarketPrice, NewsArticle, NewsSyncCursor, Produce, User
+from .object_cache import TieredCache, getOrCompute
+from .prices import MarketPriceIndex, encodeCursor, getPriceTrends, storeMarketPriceHistory
+from .response_cache import ResponseCache
+
+
+class StubGovDataHandler(BaseHTTPRequestHandler):
+    records_per_state = 5
+    delay = 0.0
+    max_limit = None
+    failing_states = ()
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        state = query["filters[state]"][0]
+        offset, limit = int(query["offset"][0]), int(query["limit"][0])
+        limit = min(limit, self.max_limit or limit)
+        time.sleep(self.delay)
+        if state in self.failing_states:
+            self.send_response(502)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        records = [
+            {"state": state, "commodity": f"crop-{n}"}
+            for n in range(offset, min(offset + limit, self.records_per_state))
+        ]
+        body = json.dumps({"total": self.records_per_state, "records": records}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MarketPriceCursorTests(SimpleTestCase):
+    def setUp(self):
+        records = [{"state": "Punjab", "commodity": f"crop-{n}", "modal_price": str(n)} for n in range(5)]
+        self.index = MarketPriceIndex(records, fetched_at=1.0)
+
+    def test_pages_with_cursor(self):
+        first, total, cursor = self.index.query(sort="modal_price", limit=3)
+        second, _, end = self.index.query(sort="modal_price", cursor=cursor, limit=3)
+        self.assertEqual([r["commodity"] for r in first + second], [f"crop-{n}" for n in range(5)])
+        self.assertEqual((total, end), (5, None))
+
+    def test_date_bounds_skip_unparseable_dates(self):
+        records = [
+            {"state": "Punjab", "commodity": "wheat", "arrival_date": "01/03/2024"},
+            {"state": "Punjab", "commodity": "rice", "arrival_date": "not a date"},
+            {"state": "Punjab", "commodity": "maize", "arrival_date": "15/03/2024"},
+            {"state": "Punjab", "commodity": "gram"},
+        ]
+        index = MarketPriceIndex(records, fetched_at=1.0)
+
+        def commodities(**bounds):
+            found, _, _ = index.query(sort="commodity", **bounds)
+            return [r["commodity"] for r in found]
+
+        self.assertEqual(commodities(until=datetime.date(2024, 3, 10)), ["wheat"])
+        self.assertEqual(commodities(since=datetime.date(2024, 3, 10)), ["maize"])
+        self.assertEqual(commodities(since=datetime.date(2024, 1, 1), until=datetime.date(2024, 12, 31)), ["maize", "wheat"])
+        self.assertEqual(commodities(), ["gram", "maize", "rice", "wheat"])
+
+    def test_malformed_cursors_are_rejected(self):
+        cursors = [
+            encodeCursor(["1.0", "modal_price"]),
+            encodeCursor({"v": 1.0, "s": "modal_price", "k": 2.0}),
+            encodeCursor({"v": 1.0, "s": "modal_price", "k": "two", "p": 1}),
+        ]
+        for cursor in cursors:
+            with self.assertRaisesMessage(ValueError, "Invalid cursor"):
+                self.index.query(sort="modal_price", cursor=cursor)
+
+
+def priceReport(market, arrival_date, modal_price, commodity="Wheat"):
+    return {"state": "Punjab", "district": "Ludhiana", "market": market, "commodity": commodity,
+            "variety": "Dara", "grade": "FAQ", "arrival_date": arrival_date,
+            "min_price": str(modal_price - 100), "max_price": str(modal_price + 100), "modal_price": str(modal_price)}
+
+
+class PriceHistoryTests(TestCase):
+    def setUp(self):
+        storeMarketPriceHistory([
+            priceReport("Khanna", "01/03/2024", 2200),
+            priceReport("Khanna", "02/03/2024", 2300),
+            priceReport("Khanna", "11/03/2024", 2500),
+            priceReport("Jagraon", "01/03/2024", 2100),
+            priceReport("Jagraon", "01/03/2024", 900, commodity="Onion"),
+            priceReport("Jagraon", "not a date", 2000),
+        ])
+
+    def test_repeated_reports_are_stored_once(self):
+        storeMarketPriceHistory([priceReport("Khanna", "01/03/2024", 2200), priceReport("Khanna", "12/03/2024", 2600)])
+        self.assertEqual(MarketPrice.objects.count(), 6)
+        self.assertEqual(MarketPrice.objects.filter(market="Khanna").count(), 4)
+
+    def test_weekly_trends_per_market(self):
+        trends = getPriceTrends("wheat", period="week")
+        self.assertEqual(trends, [
+            {"market": "Jagraon", "period": "2024-03-03", "min_price": 2000.0, "max_price": 2200.0,
+             "modal_price": 2100.0, "reports": 1},
+            {"market": "Khanna", "period": "2024-03-03", "min_price": 2100.0, "max_price": 2400.0,
+             "modal_price": 2250.0, "reports": 2},
+            {"market": "Khanna", "period": "2024-03-17", "min_price": 2400.0, "max_price": 2600.0,
+             "modal_price": 2500.0, "reports": 1},
+        ])
+
+    def test_names_match_case_insensitively_with_date_bounds(self):
+        trends = getPriceTrends("WHEAT", market="khanna", state="PUNJAB",
+                                since=datetime.date(2024, 3, 2), until=datetime.date(2024, 3, 10))
+        self.assertEqual([(t["period"], t["modal_price"]) for t in trends], [("2024-03-02", 2300.0)])
+        with self.assertRaises(ValueError):
+            getPriceTrends("wheat", period="year")
+
+
+class MarketPriceFetchTests(SimpleTestCase):
+    def setUp(self):
+        StubGovDataHandler.delay = 0.0
+        StubGovDataHandler.max_limit = None
+        StubGovDataHandler.failing_states = ()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubGovDataHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/resource"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_pages_through_all_records(self):
+        records = getMarketPricesForState("Punjab", base_url=self.url, page_size=2)
+        self.assertEqual([r["commodity"] for r in records], [f"crop-{n}" for n in range(5)])
+
+    def test_keeps_paging_when_the_api_caps_the_page_size(self):
+        StubGovDataHandler.max_limit = 2
+        records = getMarketPricesForState("Punjab", base_url=self.url, page_size=10)
+        self.assertEqual([r["commodity"] for r in records], [f"crop-{n}" for n in range(5)])
+
+    def test_failed_states_keep_their_previous_records(self):
+        StubGovDataHandler.failing_states = ("Bihar", "Kerala")
+        client = UpstreamClient("govdata-test", retries=0, failure_threshold=100)
+        previous = [{"state": "Bihar", "commodity": "old-bihar"}, {"state": "Punjab", "commodity": "old-punjab"}]
+        records = getMarketPricesAllStates(states=["Punjab", "Bihar", "Kerala"], base_url=self.url,
+                                           client=client, previous=previous)
+        self.assertEqual([r["commodity"] for r in records], [f"crop-{n}" for n in range(5)] + ["old-bihar"])
+
+        # Nothing fetched at all: no new data to publish
+        StubGovDataHandler.failing_states = ("Punjab", "Bihar", "Kerala")
+        client = UpstreamClient("govdata-test", retries=0, failure_threshold=100)
+        self.assertEqual(getMarketPricesAllStates(states=["Punjab", "Bihar", "Kerala"], base_url=self.url,
+                                                  client=client, previous=previous), [])
+
+    def test_states_are_fetched_concurrently(self):
+        StubGovDataHandler.delay = 0.3
+        states = ["Kerala", "Punjab", "Bihar", "Gujarat", "Uttar Pradesh"]
+        started = time.monotonic()
+        records = getMarketPricesAllStates(states=states, base_url=self.url)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(len(records), 5 * len(states))
+        self.assertEqual(records[0]["state"], "Kerala")
+        self.assertEqual(records[-1]["state"], "Uttar Pradesh")
+
+
+class ScriptedUpstreamHandler(BaseHTTPRequestHandler):
+    """Answers each request with the next (status, body) from `script`, repeating the last one."""
+    script = [(200, {})]
+    hits = 0
+
+    def do_GET(self):
+        cls = type(self)
+        status, payload = cls.script[min(cls.hits, len(cls.script) - 1)]
+        cls.hits += 1
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class UpstreamClientTests(SimpleTestCase):
+    def setUp(self):
+        ScriptedUpstreamHandler.hits = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), ScriptedUpstreamHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/data"
+
+    def upstream(self, **options):
+        options = {"retries": 0, "backoff_factor": 0, "failure_threshold": 2, "reset_timeout": 0.2, **options}
+        return UpstreamClient("test", **options)
+
+    def test_circuit_opens_after_threshold_and_probes_once_when_half_open(self):
+        ScriptedUpstreamHandler.script = [(500, {})]
+        client = self.upstream()
+        for _ in range(2):
+            with self.assertRaises(requests.HTTPError):
+                client.get_json(self.url)
+        self.assertEqual(client.breaker.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            client.get_json(self.url)
+        self.assertEqual(ScriptedUpstreamHandler.hits, 2)
+
+        time.sleep(0.25)
+        self.assertEqual(client.breaker.state, "half-open")
+        self.assertTrue(client.breaker.allow())
+        # Only one trial call while it is running
+        self.assertFalse(client.breaker.allow())
+        client.breaker.record_failure()
+        self.assertEqual(client.breaker.state, "open")
+
+        time.sleep(0.25)
+        ScriptedUpstreamHandler.script = [(200, {"ok": True})]
+        ScriptedUpstreamHandler.hits = 0
+        self.assertEqual(client.get_json(self.url), {"ok": True})
+        self.assertEqual(client.breaker.state, "closed")
+
+    def test_last_good_response_is_served_on_failure_and_while_open(self):
+        ScriptedUpstreamHandler.script = [(200, {"price": 1}), (503, {})]
+        client = self.upstream()
+        self.assertEqual(client.get_json(self.url, params={"q": "wheat"}), {"price": 1})
+        for _ in range(3):
+            self.assertEqual(client.get_json(self.url, params={"q": "wheat"}), {"price": 1})
+        with self.assertRaises(CircuitOpenError):
+            client.get_json(self.url, params={"q": "rice"})
+        stats = client.stats()
+        self.assertEqual((stats["circuit"], stats["errors"], stats["short_circuited"], stats["stale_served"]),
+                         ("open", 2, 2, 3))
+
+    def test_client_errors_are_not_retried_or_counted_against_the_upstream(self):
+        ScriptedUpstreamHandler.script = [(404, {"error": "unknown state"})]
+        client = self.upstream(retries=3)
+        for _ in range(3):
+            self.assertEqual(client.get_json(self.url), {"error": "unknown state"})
+        self.assertEqual(ScriptedUpstreamHandler.hits, 3)
+        self.assertEqual(client.breaker.state, "closed")
+
+        ScriptedUpstreamHandler.script = [(503, {}), (503, {}), (200, {"ok": True})]
+        ScriptedUpstreamHandler.hits = 0
+        self.assertEqual(client.get_json(self.url), {"ok": True})
+        self.assertEqual(ScriptedUpstreamHandler.hits, 3)
+
+    def test_retry_backoff_is_capped(self):
+        client = self.upstream(retries=10, backoff_factor=0.5, backoff_max=2)
+        retry = client.session.get_adapter(self.url).max_retries
+        failures = tuple(RequestHistory("GET", self.url, None, 503, None) for _ in range(8))
+        self.assertEqual(retry.new(history=failures[:3]).get_backoff_time(), 2.0)
+        self.assertEqual(retry.new(history=failures).get_backoff_time(), 2.0)
+        self.assertEqual(retry.new(history=failures[:2]).get_backoff_time(), 1.0)
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModels:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content_stream(self, model, contents, config):
+        self.calls += 1
+        yield FakeChunk(json.dumps({"CarbonEmission": 12.0, "response": f"answer {self.calls}"}))
+
+
+class FakeClient:
+    def __init__(self):
+        self.models = FakeModels()
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.client = FakeClient()
+        self.engine = ChatbotEngine(client=self.client, config=object(), response_cache=ResponseCache())
+
+    def test_near_duplicate_question_is_served_from_cache(self):
+        first, history = self.engine.respond("How much urea for wheat on 2 acres?")
+        second, _ = self.engine.respond("how much urea for wheat on 2 acres")
+        third, _ = ChatbotEngine(client=self.client, config=object(), response_cache=self.engine.response_cache) \
+            .respond("How much urea should I use for wheat on 2 acres?")
+        self.assertEqual(self.client.models.calls, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(first, third)
+        stats = self.engine.response_cache.stats()
+        self.assertEqual((stats["exact_hits"], stats["near_hits"], stats["misses"]), (1, 1, 1))
+
+    def test_different_quantities_are_not_shared(self):
+        self.engine.respond("How much urea for wheat on 2 acres?")
+        self.engine.respond("How much urea for wheat on 5 acres?")
+        self.assertEqual(self.client.models.calls, 2)
+
+    def test_cached_replies_still_extend_history(self):
+        _, history = self.engine.respond("How much urea for wheat on 2 acres?")
+        _, history = self.engine.respond("How much urea for wheat on 2 acres?", history)
+        self.assertEqual(len(history["messages"]), 4)
+
+    def test_follow_ups_are_not_shared_across_conversations(self):
+        _, urea = self.engine.respond("How much urea for wheat on 2 acres?")
+        _, drip = self.engine.respond("Should I switch my rice field to drip irrigation?")
+        first, _ = self.engine.respond("yes", urea)
+        second, _ = self.engine.respond("yes", drip)
+        self.assertEqual(self.client.models.calls, 4)
+        self.assertNotEqual(first, second)
+        again, _ = self.engine.respond("yes", urea)
+        self.assertEqual((again, self.client.models.calls), (first, 4))
+
+
+def streamDeltas(parser, payload, chunk_size):
+    events = []
+    for start in range(0, len(payload), chunk_size):
+        events.extend(parser.feed(payload[start:start + chunk_size]))
+    return "".join(event[1] for event in events if event[0] == "delta"), events
+
+
+class IncrementalJsonFieldsTests(SimpleTestCase):
+    text = 'Use 50 kg "urea" \\ split\ndose 🌾😀 é'
+
+    def test_deltas_rebuild_the_text_for_any_chunking(self):
+        payload = json.dumps({"response": self.text, "suggestions": ["a", "b"], "CarbonEmission": 1.5})
+        for chunk_size in (1, 2, 3, 7, len(payload)):
+            text, events = streamDeltas(IncrementalJsonFields(), payload, chunk_size)
+            self.assertEqual(text, self.text)
+            fields = {event[1]: event[2] for event in events if event[0] == "field"}
+            self.assertEqual(fields, {"response": self.text, "suggestions": ["a", "b"], "CarbonEmission": 1.5})
+
+    def test_surrogate_pair_split_across_chunks(self):
+        parser = IncrementalJsonFields()
+        self.assertEqual(parser.feed('{"response": "ok \\ud83d'), [("delta", "ok ")])
+        self.assertEqual(parser.feed('\\ude00!'), [("delta", "😀!")])
+        self.assertEqual(parser.feed('"}'), [("field", "response", "ok 😀!")])
+
+
+def chatReply(text, **profile):
+    return json.dumps({"response": text, **profile})
+
+
+class ConversationMemoryTests(SimpleTestCase):
+    def memory_after(self, turns, **limits):
+        memory = ConversationMemory(**limits)
+        for n in range(turns):
+            memory.add("user", f"question {n}")
+            memory.add("assistant", chatReply(f"answer {n}", crop_details=[{"crop_name": f"crop-{n}"}]))
+            memory.compact()
+        return memory
+
+    def test_older_turns_fold_into_the_summary(self):
+        memory = self.memory_after(6, max_messages=4, max_bytes=100000)
+        self.assertEqual(len(memory.messages), 4)
+        self.assertEqual(memory.messages[0]["parts"][0]["text"], "question 4")
+        self.assertEqual(memory.summary["earlier_questions"], [f"question {n}" for n in range(4)])
+        # Latest value wins in the folded profile; the verbatim messages override it
+        self.assertEqual(memory.summary["profile"]["crop_details"], [{"crop_name": "crop-3"}])
+        self.assertEqual(memory.farm_profile()["crop_details"], [{"crop_name": "crop-5"}])
+        self.assertEqual(len(memory.context()), 5)
+
+    def test_byte_budget_is_enforced_but_the_last_exchange_is_kept(self):
+        memory = self.memory_after(10, max_messages=100, max_bytes=1500)
+        self.assertLessEqual(memory.size(), 1500)
+        self.assertEqual(memory.summary["earlier_questions"][-1], f"question {9 - len(memory.messages) // 2}")
+
+        memory = self.memory_after(1, max_messages=100, max_bytes=10)
+        memory.add("user", "x" * 500)
+        memory.add("assistant", chatReply("y" * 500))
+        memory.compact()
+        self.assertEqual([m["parts"][0]["text"] for m in memory.messages], ["x" * 500, chatReply("y" * 500)])
+
+    def test_state_round_trip_and_legacy_history(self):
+        memory = self.memory_after(6, max_messages=4, max_bytes=100000)
+        restored = ConversationMemory.from_state(json.loads(json.dumps(memory.to_state())))
+        self.assertEqual(restored.to_state(), memory.to_state())
+
+        legacy = [{"role": "user" if n % 2 == 0 else "model", "parts": [{"text": f"m{n}"}]} for n in range(20)]
+        restored = ConversationMemory.from_state(legacy, max_messages=4, max_bytes=100000)
+        self.assertEqual([m["parts"][0]["text"] for m in restored.messages], ["m16", "m17", "m18", "m19"])
+        self.assertEqual(restored.summary["earlier_questions"], ["m6", "m8", "m10", "m12", "m14"])
+
+
+class ChatStoreTests(TestCase):
+    def test_reloaded_conversation_matches_the_engine_state(self):
+        engine = ChatbotEngine(client=FakeClient(), config=object())
+        session = SessionStore()
+        farmerid = User.objects.create().id
+        for n in range(3 * CHATBOT_HISTORY_MESSAGES):
+            conversation = getConversation(session, farmerid)
+            _, state = engine.respond(f"question {n}", loadHistoryState(conversation))
+            recordTurn(conversation, state)
+
+            reloaded = ChatConversation.objects.get(id=conversation.id)
+            self.assertEqual(loadHistoryState(reloaded), state)
+            self.assertEqual(list(session.keys()), [SESSION_KEY])
+
+        self.assertEqual(ChatConversation.objects.count(), 1)
+        self.assertEqual(ChatTurn.objects.count(), 6 * CHATBOT_HISTORY_MESSAGES)
+        self.assertGreater(reloaded.summarized_through_id, 0)
+        self.assertEqual(len(state["summary"]["earlier_questions"]), 5)
+        chatlog = getChatlog(reloaded)
+        self.assertEqual(chatlog["queries"][-1], f"question {3 * CHATBOT_HISTORY_MESSAGES - 1}")
+        self.assertEqual(len(chatlog["responses"]), 3 * CHATBOT_HISTORY_MESSAGES)
+
+    def test_legacy_session_history_moves_into_the_store(self):
+        session = SessionStore()
+        session["conversation_history"] = [
+            {"role": "user", "parts": [{"text": "old question"}]},
+            {"role": "model", "parts": [{"text": chatReply("old answer")}]},
+        ]
+        session["chatlog"] = {"queries": ["old question"], "responses": ["old answer"]}
+        conversation = getConversation(session, User.objects.create().id)
+        self.assertEqual(list(session.keys()), [SESSION_KEY])
+        self.assertEqual([m["parts"][0]["text"] for m in loadHistoryState(conversation)["messages"]],
+                         ["old question", chatReply("old answer")])
+
+
+class ChatbotStreamApiTests(TestCase):
+    def test_events_are_framed_as_server_sent_events(self):
+        request = RequestFactory().post("/chatbot-api/stream/", {"query": "hello"})
+        request.session = SessionStore()
+        request.session["member_logged_id"] = User.objects.create().id
+        state = {"summary": {"profile": {}, "earlier_questions": []}, "messages": [
+            {"role": "user", "parts": [{"text": "hello"}]},
+            {"role": "assistant", "parts": [{"text": '{"response": "hi"}'}]},
+        ]}
+        events = [("delta", "h"), ("delta", "i"), ("field", "response", "hi"), ("done", {"response": "hi"}, state)]
+        with mock.patch.object(views, "GetResponseStream", lambda query, history: iter(events)):
+            response = views.chatbot_stream_api(request)
+            body = b"".join(response.streaming_content).decode()
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        frames = [frame.split("\n") for frame in body.split("\n\n") if frame]
+        self.assertEqual([frame[0] for frame in frames], ["event: delta"] * 2 + ["event: field", "event: done"])
+        self.assertEqual(json.loads(frames[1][1][len("data: "):]), {"text": "i"})
+        self.assertEqual(json.loads(frames[3][1][len("data: "):])["response"], "hi")
+        self.assertEqual(ChatTurn.objects.count(), 2)
+
+
+FARM_PROFILE = {
+    "crop_details": [{"area": 2, "unit": "hectares", "crop_yield": 3}],
+    "machinery_usage": [{"fuel_type": "diesel", "hours_per_season": 10}],
+    "farming_practices": {"fertilizer_usage": [{"fertilizer_type": "Urea", "amount": 50, "application_frequency": 2}]},
+    "livestock_management": {"has_livestock": True, "livestock_type": "cow", "livestock_count": 2,
+                             "manure_management": "compost"},
+    "transportation_emissions": {"distance_to_market": 10, "transport_method": "truck"},
+    "crop_residue_management": "burned",
+    "carbon_sequestration_practices": {"cover_crops": True},
+}
+
+
+class CarbonEstimateTests(TestCase):
+    def test_components_follow_the_factor_tables(self):
+        results = estimateEmissions([FARM_PROFILE, {}])
+        expected = {"machinery": 214.4, "fertilizer": 390.0, "livestock": 2110.0, "transport": 6.0,
+                    "residue": 282.0, "sequestration": -600.0, "total": 2402.4}
+        for name, value in expected.items():
+            self.assertAlmostEqual(float(results[name][0]), value, places=6)
+            self.assertEqual(float(results[name][1]), 0.0)
+
+    def test_non_finite_numbers_are_rejected(self):
+        for value in ("NaN", "inf", "-Infinity"):
+            with self.assertRaisesMessage(ValueError, "Not a finite number"):
+                estimateEmissions([{"machinery_usage": [{"fuel_type": "diesel", "hours_per_season": value}]}])
+
+    def report(self, body):
+        request = RequestFactory().post("/api/carbon/report/", body, content_type="application/json")
+        request.session = SessionStore()
+        request.session["member_logged_id"] = 1
+        return views.carbon_report_api(request)
+
+    def test_report_totals_and_validation(self):
+        response = self.report(json.dumps({"profiles": [FARM_PROFILE, FARM_PROFILE]}))
+        self.assertEqual(response.status_code, 200)
+        report = json.loads(response.content)
+        self.assertEqual(report["results"][0]["total"], 2402.4)
+        self.assertEqual(report["summary"]["total"], 4804.8)
+
+        bad = {"machinery_usage": [{"fuel_type": "diesel", "hours_per_season": "NaN"}]}
+        for body in (json.dumps({"profiles": [bad]}), "not json", json.dumps({"profiles": "x"})):
+            self.assertEqual(self.report(body).status_code, 400)
+
+
+class ProduceFarmerLoadingTests(TestCase):
+    def setUp(self):
+        farmers = [User.objects.create() for _ in range(5)]
+        Produce.objects.bulk_create([
+            Produce(farmerid=farmers[n % len(farmers)].id, name=f"crop-{n}", price=10, quantity=1, unit="quintals")
+            for n in range(100)
+        ])
+
+    def test_listings_load_farmers_in_constant_queries(self):
+        with self.assertNumQueries(2):
+            produces = list(Produce.objects.with_farmers())
+            farmerids = {produce.user.id for produce in produces}
+        self.assertEqual(len(produces), 100)
+        self.assertEqual(farmerids, {produce.farmerid for produce in produces})
+
+    def test_filtered_and_sliced_querysets_keep_the_loader(self):
+        with self.assertNumQueries(2):
+            for produce in Produce.objects.with_farmers().filter(price=10).order_by("-id")[:20]:
+                self.assertEqual(produce.user.id, produce.farmerid)
+
+
+class ListingSummaryTests(TestCase):
+    def test_counters_follow_creates_and_deletes(self):
+        farmer, other = User.objects.create(), User.objects.create()
+        for n in range(3):
+            Produce.objects.create(farmerid=farmer.id, name=f"crop-{n}", price=10, quantity=1, unit="quintals")
+        Produce.objects.create(farmerid=other.id, name="other", price=10, quantity=1, unit="quintals")
+        Produce.objects.filter(farmerid=farmer.id).first().delete()
+
+        with self.assertNumQueries(1):
+            summary = getListingSummary(farmer.id)
+        self.assertEqual((summary["produces_count"], summary["public_produces_count"]), (2, 3))
+        self.assertEqual(summary["last_listing"].name, "crop-2")
+        self.assertEqual(getListingSummary(User.objects.create().id)["last_listing"], "")
+
+    def test_counters_seeded_from_existing_listings(self):
+        farmer, other, idle = User.objects.create(), User.objects.create(), User.objects.create()
+        # Listings stored before the counters existed (bulk_create sends no signals)
+        Produce.objects.bulk_create(
+            [Produce(farmerid=farmer.id, name=f"old-{n}", price=10, quantity=1, unit="quintals") for n in range(10)]
+            + [Produce(farmerid=other.id, name="other", price=10, quantity=1, unit="quintals")]
+        )
+        Produce.objects.create(farmerid=farmer.id, name="new", price=10, quantity=1, unit="quintals")
+
+        summary = getListingSummary(farmer.id)
+        self.assertEqual((summary["produces_count"], summary["public_produces_count"]), (11, 12))
+        self.assertEqual(summary["last_listing"].name, "new")
+        self.assertEqual(getListingSummary(other.id)["produces_count"], 1)
+        self.assertEqual(getListingSummary(idle.id)["public_produces_count"], 12)
+
+
+class ListingImportExportTests(TestCase):
+    def setUp(self):
+        self.farmer = User.objects.create()
+        Produce.objects.create(farmerid=User.objects.create().id, name="other", price=10, quantity=1, unit="quintals")
+
+    def call(self, view, request):
+        request.session = SessionStore()
+        request.session["member_logged_id"] = self.farmer.id
+        return view(request)
+
+    def import_rows(self, body, content_type="application/json"):
+        return self.call(views.import_listings_api,
+                         RequestFactory().post("/list_product/import/", body, content_type=content_type))
+
+    def counts(self):
+        return dict(ListingCounter.objects.values_list("farmerid", "count"))
+
+    def test_one_invalid_row_imports_nothing(self):
+        rows = [{"name": "Wheat", "price": 2200, "quantity": 5}, {"name": "Rice", "price": "cheap", "quantity": 5},
+                "not a row"]
+        response = self.import_rows(json.dumps({"rows": rows}))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(json.loads(response.content)["rows"]), ["2", "3"])
+        self.assertFalse(Produce.objects.filter(farmerid=self.farmer.id).exists())
+        self.assertEqual(self.counts()[ListingCounter.ALL_FARMERS], 1)
+
+    def test_csv_import_bumps_counters_and_exports_round_trip(self):
+        body = "name,price,quantity\nWheat,2200,5\nRice,3100,8\nMaize,1900,12\n"
+        response = self.import_rows(body, content_type="text/csv")
+        self.assertEqual((response.status_code, json.loads(response.content)), (201, {"created": 3}))
+        self.assertEqual(self.counts()[self.farmer.id], 3)
+        self.assertEqual(self.counts()[ListingCounter.ALL_FARMERS], 4)
+
+        response = self.call(views.export_listings, RequestFactory().get("/check_products/export/"))
+        self.assertEqual(response["Content-Type"], "text/csv")
+        exported = list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual([(r["name"], r["price"], r["quantity"]) for r in exported],
+                         [("Wheat", "2200.0", "5.0"), ("Rice", "3100.0", "8.0"), ("Maize", "1900.0", "12.0")])
+        self.assertEqual(list(exported[0]), EXPORT_FIELDS)
+
+        response = self.call(views.export_listings, RequestFactory().get("/check_products/export/", {"format": "json"}))
+        exported = json.loads(b"".join(response.streaming_content))
+        self.assertEqual([row["name"] for row in exported], ["Wheat", "Rice", "Maize"])
+        self.assertEqual(exported[0]["unit"], "quintals")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="listings.json"')
+
+
+class MarketplaceSearchTests(TestCase):
+    def setUp(self):
+        for n, name in enumerate(["Organic Wheat", "wheat", "Basmati Rice", "Wheat flour", "Onion"]):
+            Produce.objects.create(farmerid=1, name=name, price=1000 + n * 100, quantity=10, unit="quintals")
+
+    def test_full_text_match_with_filters_and_cursor(self):
+        first, cursor = searchListings(query="whe", limit=2)
+        second, end = searchListings(query="whe", cursor=cursor, limit=2)
+        self.assertEqual([p.name for p in first + second], ["Wheat flour", "wheat", "Organic Wheat"])
+        self.assertIsNone(end)
+        cheap, _ = searchListings(query="wheat", max_price=1100)
+        self.assertEqual([p.name for p in cheap], ["wheat", "Organic Wheat"])
+
+    def test_malformed_cursors_are_rejected(self):
+        for cursor in ["not base64!", encodeCursor({"a": 1}), encodeCursor(["2024-01-01"]), encodeCursor(7)]:
+            with self.assertRaisesMessage(ValueError, "Invalid cursor"):
+                searchListings(query="wheat", cursor=cursor)
+
+    def test_index_follows_renames_and_deletes(self):
+        Produce.objects.filter(name="Onion").update(name="Red onion")
+        Produce.objects.filter(name="Basmati Rice").delete()
+        self.assertEqual([p.name for p in searchListings(query="red onion")[0]], ["Red onion"])
+        self.assertEqual(searchListings(query="basmati")[0], [])
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = TieredCache(shared=LocMemCache("single-flight-test", {}))
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+
+    def compute(self):
+        with self.calls_lock:
+            self.calls += 1
+            call = self.calls
+        time.sleep(0.2)
+        return call
+
+    def get_concurrently(self, threads=16):
+        with ThreadPoolExecutor(threads) as pool:
+            return list(pool.map(
+                lambda _: getOrCompute("news", self.compute, timeout=0.5, stale_timeout=60, beta=0, cache=self.cache),
+                range(threads),
+            ))
+
+    def test_one_upstream_call_per_expiry(self):
+        self.assertEqual(self.get_concurrently(), [1] * 16)
+        self.assertEqual(self.calls, 1)
+
+        time.sleep(0.6)
+        self.cache.clear_local()
+        results = self.get_concurrently()
+        self.assertEqual(self.calls, 2)
+        # Everyone but the refreshing caller gets the stale value without waiting
+        self.assertEqual(sorted(results), [1] * 15 + [2])
+        self.assertEqual(getOrCompute("news", self.compute, timeout=0.5, beta=0, cache=self.cache), 2)
+
+    def test_local_hits_are_copies(self):
+        self.cache.set("listing_summary_1", {"produces_count": 2})
+        self.cache.get("listing_summary_1")["produces_count"] = 99
+        self.assertEqual(self.cache.get("listing_summary_1"), {"produces_count": 2})
+        self.assertEqual(self.cache.stats()["listing_summary"]["local_hits"], 2)
+
+    def test_failed_refresh_serves_stale_value(self):
+        getOrCompute("news", self.compute, timeout=0.1, stale_timeout=60, beta=0, cache=self.cache)
+        time.sleep(0.2)
+
+        def fail():
+            raise RuntimeError("upstream down")
+
+        self.assertEqual(getOrCompute("news", fail, timeout=0.1, beta=0, cache=self.cache), 1)
+        self.assertIsNone(self.cache.shared.get("news:computing"))
+
+
+class FakeNewsAPI:
+    """NewsAPI `everything` search over a fixed set of articles, newest first."""
+
+    def __init__(self, count, start):
+        self.articles = [
+            {"url": f"https://news.example/{n}", "title": f"Story {n}",
+             "publishedAt": (start + datetime.timedelta(minutes=n)).strftime("%Y-%m-%dT%H:%M:%SZ")}
+            for n in range(count)
+        ]
+        self.fail = False
+
+    def __call__(self, since=None, until=None, page=1, page_size=20):
+        if self.fail:
+            return None
+        matching = [
+            a for a in reversed(self.articles)
+            if (not since or a["publishedAt"] >= since) and (not until or a["publishedAt"] <= until)
+        ]
+        return matching[(page - 1) * page_size:page * page_size]
+
+
+class NewsIngestTests(TestCase):
+    def setUp(self):
+        self.api = FakeNewsAPI(150, start=timezone.now() - datetime.timedelta(days=1))
+        patcher = mock.patch.object(news, "getAgroNews", self.api)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_backlog_larger_than_one_run_is_fetched_over_later_runs(self):
+        counts = []
+        for _ in range(5):
+            counts.append(news.ingestNewsArticles(max_pages=2, page_size=20))
+            # The window must not depend on anything the cache may evict
+            cache.clear()
+        self.assertEqual(sum(counts), 150)
+        self.assertEqual(NewsArticle.objects.count(), 150)
+
+        self.api.articles += FakeNewsAPI(155, start=timezone.now() - datetime.timedelta(days=1)).articles[150:]
+        self.assertEqual(news.ingestNewsArticles(max_pages=2, page_size=20), 5)
+
+    def test_failed_fetch_raises_and_keeps_the_cursor(self):
+        news.ingestNewsArticles(max_pages=2, page_size=20)
+        cursor = NewsSyncCursor.objects.values("since", "until").get()
+        self.api.fail = True
+        with self.assertRaises(RuntimeError):
+            news.ingestNewsArticles(max_pages=2, page_size=20)
+        self.assertEqual(NewsSyncCursor.objects.values("since", "until").get(), cursor)
+        self.assertEqual(NewsArticle.objects.count(), 40)
+
+
+class StubCropModel:
+    """Picklable stand-in for the crop model: predicts "crop-<nitrogen>"."""
+
+    def __init__(self):
+        self.weights = np.arange(4096, dtype=float)
+
+    def predict(self, matrix):
+        return np.array([f"crop-{int(row[0])}" for row in matrix])
+
+
+def postJson(view, path, payload, *args):
+    request = RequestFactory().post(path, json.dumps(payload), content_type="application/json")
+    request.session = SessionStore()
+    request.session["member_logged_id"] = 1
+    return view(request, *args)
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(self.directory, "Crop.joblib")
+        joblib.dump(StubCropModel(), self.path)
+
+    def registry(self, **options):
+        return ModelRegistry(directory=self.directory, artifacts={"crop": "Crop"}, **options)
+
+    def test_models_load_lazily_and_once(self):
+        registry = self.registry()
+        with mock.patch.object(model_registry.joblib, "load", wraps=joblib.load) as load:
+            self.assertEqual(registry.stats(), {"crop": {"loaded": False}})
+            with ThreadPoolExecutor(8) as pool:
+                models = list(pool.map(lambda _: registry.get("crop"), range(8)))
+        self.assertEqual(load.call_count, 1)
+        self.assertTrue(all(model is models[0] for model in models))
+        stats = registry.stats()["crop"]
+        self.assertEqual((stats["loaded"], stats["format"], stats["mmapped_array_bytes"]), (True, "joblib", 4096 * 8))
+
+    def test_checksums_are_verified(self):
+        with open(self.path + ".sha256", "w") as f:
+            f.write(fileChecksum(self.path) + "  Crop.joblib\n")
+        registry = self.registry()
+        registry.get("crop")
+        self.assertTrue(registry.stats()["crop"]["checksum_verified"])
+
+        registry = self.registry(checksums={"crop": "0" * 64})
+        with self.assertRaisesMessage(ModelUnavailable, "Checksum mismatch"):
+            registry.get("crop")
+        self.assertIn("Checksum mismatch", registry.stats()["crop"]["error"])
+
+    def test_batch_endpoint_answers_503_when_the_model_is_unavailable(self):
+        with mock.patch.object(views, "modelRegistry", self.registry(checksums={"crop": "0" * 64})):
+            response = postJson(views.batch_predict_api, "/api/predict/crop/", [], "crop")
+        self.assertEqual(response.status_code, 503)
+
+
+def soilRow(nitrogen, **fields):
+    return {"nitrogen": nitrogen, "phosphorus": 40, "potassium": 40, "temperature": 25,
+            "humidity": 70, "PH": 6.5, "rainfall": 120, **fields}
+
+
+class BatchPredictApiTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        joblib.dump(StubCropModel(), os.path.join(directory.name, "Crop.joblib"))
+        registry = ModelRegistry(directory=directory.name, artifacts={"crop": "Crop"})
+        patcher = mock.patch.object(views, "modelRegistry", registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def predict(self, payload, path="/api/predict/crop/"):
+        response = postJson(views.batch_predict_api, path, payload, "crop")
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def test_results_follow_input_order_with_per_row_errors(self):
+        rows = [soilRow(10), {"nitrogen": 20}, soilRow(30, PH="acidic"), soilRow(40, rainfall=None), soilRow(50)]
+        with mock.patch.object(views, "getWeather", return_value=None), \
+                mock.patch.object(views, "getDetailsFromUID"):
+            results = [json.loads(line) for line in self.predict({"rows": rows}).splitlines()]
+        self.assertEqual([result["row"] for result in results], [0, 1, 2, 3, 4])
+        self.assertEqual(results[0], {"row": 0, "prediction": "crop-10"})
+        self.assertEqual(results[1], {"row": 1, "error": "Missing field: phosphorus"})
+        self.assertIn("acidic", results[2]["error"])
+        self.assertIn("error", results[3])
+        self.assertEqual(results[4], {"row": 4, "prediction": "crop-50"})
+
+    def test_rows_without_readings_use_the_users_weather(self):
+        row = soilRow(10)
+        del row["temperature"], row["humidity"]
+        with mock.patch.object(views, "getWeather", return_value=("Pune", 31.0, 60.0)) as weather, \
+                mock.patch.object(views, "getDetailsFromUID"):
+            results = [json.loads(line) for line in self.predict([row, soilRow(20)]).splitlines()]
+        weather.assert_called_once()
+        self.assertEqual([result["prediction"] for result in results], ["crop-10", "crop-20"])
+
+    def test_readings_in_every_row_skip_the_weather_lookup(self):
+        with mock.patch.object(views, "getWeather") as weather:
+            self.predict([soilRow(10)])
+        weather.assert_not_called()
+
+    def test_csv_output(self):
+        row = soilRow(20)
+        del row["phosphorus"]
+        body = self.predict([soilRow(10), row], path="/api/predict/crop/?format=csv")
+        self.assertEqual(list(csv.DictReader(io.StringIO(body))), [
+            {"row": "0", "prediction": "crop-10", "confidence": "", "error": ""},
+            {"row": "1", "prediction": "", "confidence": "", "error": "Missing field: phosphorus"},
+        ])
+
+    def test_rejects_malformed_batches(self):
+        self.assertEqual(postJson(views.batch_predict_api, "/api/predict/crop/", [soilRow(10), 5], "crop").status_code, 400)
+        self.assertEqual(postJson(views.batch_predict_api, "/api/predict/crop/", {"rows": 5}, "crop").status_code, 400)
+        self.assertEqual(postJson(views.batch_predict_api, "/api/predict/soil/", [], "soil").status_code, 404)
+        with mock.patch.object(views, "BATCH_PREDICT_MAX_ROWS", 2):
+            response = postJson(views.batch_predict_api, "/api/predict/crop/", [soilRow(1)] * 3, "crop")
+        self.assertEqual(response.status_code, 413)
+
+
+FERTILIZER_DATASET = """Temparature,Humidity ,Moisture,Soil Type,Crop Type,Nitrogen,Potassium,Phosphorous,Fertilizer Name
+26,52,38,Sandy,Maize,37,0,0,Urea
+29,52,45,Loamy,Sugarcane,12,0,36,DAP
+34,65,62,Black,Cotton,7,9,30,14-35-14
+32,62,34,Red,Tobacco,22,0,20,28-28
+28,54,46,Clayey,Paddy,35,0,0,Urea
+26,52,35,Sandy,Barley,12,10,13,17-17-17
+"""
+
+
+def perRequestFertilizerFeatures(path, nitrogen, phosphorus, potassium, temp, humidity, moisture, soil_type, crop):
+    # Encoding as getFertilizerRecommendation used to do it: refit on every request
+    data = pd.read_csv(path)
+    soil_enc = LabelEncoder().fit(data["Soil Type"]).transform([str(soil_type)])[0]
+    crop_enc = LabelEncoder().fit(data["Crop Type"]).transform([crop])[0]
+    return [temp, humidity, moisture, soil_enc, crop_enc, nitrogen, potassium, phosphorus]
+
+
+class FertilizerEncodingTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "Fertilizer Prediction.csv")
+        with open(self.path, "w") as f:
+            f.write(FERTILIZER_DATASET)
+        patcher = mock.patch.multiple(functions, **dict(zip(("soil_type_codes", "crop_type_codes"),
+                                                            functions.loadFertilizerEncoders(self.path))))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_codes_match_the_per_request_encoders(self):
+        data = pd.read_csv(self.path)
+        for soil_type in data["Soil Type"].unique():
+            for crop in data["Crop Type"].unique():
+                readings = (37, 0, 0, 26, 52, 38, soil_type, crop)
+                self.assertEqual(functions.getFertilizerFeatures(*readings),
+                                 perRequestFertilizerFeatures(self.path, *readings))
+
+    def test_unseen_labels_are_rejected_as_before(self):
+        for soil_type, crop in (("Peaty", "Maize"), ("Sandy", "Wheat"), ("sandy", "Maize")):
+            readings = (37, 0, 0, 26, 52, 38, soil_type, crop)
+            with self.assertRaises(ValueError):
+                perRequestFertilizerFeatures(self.path, *readings)
+            with self.assertRaises(ValueError):
+                functions.getFertilizerFeatures(*readings)
+
+    def test_batch_rows_encode_like_single_requests(self):
+        fields = dict(nitrogen=37, phosphorus=0, potassium=0, temperature=26, humidity=52, moisture=38)
+        rows = [{**fields, "soil_type": "Black", "crop": "Cotton"},
+                {**fields, "soil_type": "Peaty", "crop": "Cotton"},
+                {**fields, "soil_type": "Red", "crop": "Tobacco"}]
+        matrix, indices, errors = buildFeatureMatrix("fertilizer", rows)
+        self.assertEqual(indices, [0, 2])
+        self.assertEqual(errors, {1: "Unknown soil type: 'Peaty'"})
+        for features, position in zip(matrix.tolist(), indices):
+            readings = [*fields.values(), rows[position]["soil_type"], rows[position]["crop"]]
+            self.assertEqual(features, perRequestFertilizerFeatures(self.path, *readings))
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.batches = []
+
+    def predict(self, matrix):
+        self.batches.append(len(matrix))
+        return [row[0] * 2 for row in matrix]
+
+    def test_concurrent_rows_share_one_predict_call(self):
+        batcher = MicroBatcher(self.predict, max_batch=8, max_wait=0.2, name="test")
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda n: batcher.predict([n], timeout=5), range(8)))
+        self.assertEqual(results, [n * 2 for n in range(8)])
+        self.assertEqual(self.batches, [8])
+
+    def test_model_errors_reach_every_caller(self):
+        def fail(matrix):
+            raise ValueError("bad input")
+
+        batcher = MicroBatcher(fail, max_batch=4, max_wait=0.2, name="test")
+        with ThreadPoolExecutor(4) as pool:
+            futures = [pool.submit(batcher.predict, [n], 5) for n in range(4)]
+        for future in futures:
+            with self.assertRaisesMessage(ValueError, "bad input"):
+                future.result()
+
+    def test_short_model_output_fails_the_unmatched_rows(self):
+        batcher = MicroBatcher(lambda matrix: self.predict(matrix)[:1], max_batch=3, max_wait=0.2, name="test")
+        futures = [batcher.submit([n]) for n in range(3)]
+        self.assertEqual(futures[0].result(timeout=5), 0)
+        for future in futures[1:]:
+            with self.assertRaisesMessage(RuntimeError, "1 predictions for 3 rows"):
+                future.result(timeout=5)
@@ -1,14 +1,26 @@
 
 from django.contrib import admin
 from django.urls import path, include
+from django.conf import settings
 from dashboard.views import *
 
+# Serve the views that wait on external services asynchronously under ASGI
+if getattr(settings, "DASHBOARD_ASYNC_VIEWS", False):
+    from dashboard.async_views import home_page, croprec, fertrec, news_page, crop_prices_page, chatbot_api
+
 urlpatterns = [
     path("", home_page, name ="admin"),
     path('tools/crop_recommendation', croprec),
     path('tools/fertilizer_recommendation', fertrec),
+    path('api/predict/<str:kind>/', batch_predict_api, name='batch_predict_api'),
+    path('api/inference/stats/', inference_stats_api, name='inference_stats_api'),
+    path('api/upstreams/stats/', upstream_stats_api, name='upstream_stats_api'),
+    path('api/cache/stats/', cache_stats_api, name='cache_stats_api'),
+    path('api/feeds/status/', feed_status_api, name='feed_status_api'),
     path('forum/', forum),
     path('prices/', crop_prices_page),
+    path('prices/api/', prices_api, name='prices_api'),
+    path('prices/trends/', price_trends_api, name='price_trends_api'),
     path('news/', news_page),
     path('help/', help_page,  name="help_page"),
     path('profile/', profile_page),
@@ -17,8 +29,14 @@ urlpatterns = [
     path('logout/', logout_view),
     path('list_product/', list_page),
     path('check_products/', check_my_listings),
+    path('list_product/import/', import_listings_api, name='import_listings_api'),
+    path('check_products/export/', export_listings, name='export_listings'),
     path('delete_listing/<int:id>/', delete_listing),
+    path('market/search/', marketplace_search_api, name='marketplace_search_api'),
     path('chatbot-api/', chatbot_api, name='chatbot_api'),
+    path('chatbot-api/stream/', chatbot_stream_api, name='chatbot_stream_api'),
+    path('chatbot-api/cache/stats/', chatbot_cache_stats_api, name='chatbot_cache_stats_api'),
+    path('api/carbon/report/', carbon_report_api, name='carbon_report_api'),
     path('generate_yaml/', generate_yaml, name='generate_yaml'),
     path('download_yaml/', download_yaml, name='download_yaml'),
     path('satellite/', satellite),
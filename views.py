@@ -1,18 +1,32 @@
 import datetime
 from django.shortcuts import render, redirect
-from django.core.cache import cache
 from django.db import transaction
+from django.utils import timezone
 from .models import User, Produce
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 
 from .forms import CropRecommendationForm, FertilizerPredictionForm, UserInputForm, CropProduceListForm
-import pickle
 import numpy as np
 from django.template.defaulttags import register
-from .functions import getWeatherDetails, getAgroNews, getFertilizerRecommendation, getMarketPricesAllStates, GetResponse
+from .functions import getFertilizerFeatures, GetResponse
+from .inference import iterBatchResults, getCropFeatures, MicroBatcher
+from .model_registry import ModelUnavailable, modelRegistry
+from .prices import getMarketPriceIndex, getPriceTrends
+from .weather import getWeather
+from .http_client import getUpstreamStats
+from .chatbot import GetResponseStream, getChatbotEngine
+from .carbon import estimateEmission, estimateEmissions, hasEmissionInputs, COMPONENTS
+from .listings import EXPORT_FIELDS, getListingSummary, importListings, iterListingRows
+from .marketplace import searchListings
+from .object_cache import listingSummaryCacheKey, objectCache, userCacheKey
+from .feeds import getFeedStatuses, getNews
+from .chat_store import getChatlog, getConversation, loadHistoryState, recordTurn
 import base64
 import os
 import json 
+import csv
+import io
+from django.conf import settings
 from google import genai
 from google.genai import types
 import logging
@@ -20,14 +34,20 @@ import logging
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Load models once at startup with error handling
-try:
-    cropRecommendationModel = pickle.load(open('model_code/CropRecommend.pkl', 'rb'))
-    fertilizerRecommendModel = pickle.load(open('model_code/Fertilizer.pkl', 'rb'))
-except Exception as e:
-    logger.error(f"Failed to load models: {str(e)}")
-    cropRecommendationModel = None
-    fertilizerRecommendModel = None
+# Concurrent single-row predictions are coalesced into one vectorized predict call
+INFERENCE_BATCH_WINDOW_MS = getattr(settings, "INFERENCE_BATCH_WINDOW_MS", 3)
+INFERENCE_MAX_BATCH = getattr(settings, "INFERENCE_MAX_BATCH", 32)
+# Seconds a request waits for its batched prediction before giving up
+INFERENCE_TIMEOUT = getattr(settings, "INFERENCE_TIMEOUT", 10)
+WEATHER_UNAVAILABLE_MESSAGE = "Weather data for your farm is unavailable right now, please try again shortly"
+cropBatcher = MicroBatcher(
+    lambda matrix: modelRegistry.get("crop").predict(matrix),
+    max_batch=INFERENCE_MAX_BATCH, max_wait=INFERENCE_BATCH_WINDOW_MS / 1000, name="crop",
+)
+fertilizerBatcher = MicroBatcher(
+    lambda matrix: modelRegistry.get("fertilizer").predict(matrix),
+    max_batch=INFERENCE_MAX_BATCH, max_wait=INFERENCE_BATCH_WINDOW_MS / 1000, name="fertilizer",
+)
 
 @register.filter
 def get_range(value):
@@ -38,17 +58,36 @@ def index(indexable, i):
     return indexable[i]
 
 def getDetailsFromUID(id):
-    cache_key = f'user_{id}'
-    user = cache.get(cache_key)
+    cache_key = userCacheKey(id)
+    user = objectCache.get(cache_key)
     if not user:
         try:
             user = User.objects.get(id=id)
-            cache.set(cache_key, user, timeout=300)  # Cache for 5 minutes
+            objectCache.set(cache_key, user, timeout=300)  # Cache for 5 minutes
         except User.DoesNotExist:
             logger.error(f"User with id {id} not found")
             raise
     return user
 
+NEWS_PAGE_ARTICLES = 20
+
+def get_agro_news(limit=NEWS_PAGE_ARTICLES, keyword=None):
+    return getNews(limit, keyword)
+
+LISTING_SUMMARY_CACHE_TIMEOUT = getattr(settings, "LISTING_SUMMARY_CACHE_TIMEOUT", 60)
+
+def get_listing_summary(userlogged):
+    # Invalidated when this farmer's listings change; the global count may lag by the timeout
+    cache_key = listingSummaryCacheKey(userlogged.id)
+    summary = objectCache.get(cache_key)
+    if summary is None:
+        summary = getListingSummary(userlogged.id)
+        objectCache.set(cache_key, summary, timeout=LISTING_SUMMARY_CACHE_TIMEOUT)
+    return {
+        "produces": Produce.objects.filter(farmerid=userlogged.id).with_farmers(),
+        **summary,
+    }
+
 def e404_page(request):
     error_message = request.session.get("error_message", "An error occurred")
     return render(request, "dash/404.html", {"errormsg": error_message})
@@ -61,29 +100,14 @@ def home_page(request):
 
         userlogged = getDetailsFromUID(id)
         
-        my_products = Produce.objects.filter(farmerid=userlogged.id)
-        public_products = Produce.objects.all()
-        
         # Cache expensive operations
-        weather_cache_key = f'weather_{userlogged.coords}'
-        details = cache.get(weather_cache_key)
-        if not details:
-            details = getWeatherDetails(userlogged.coords)
-            cache.set(weather_cache_key, details, timeout=3600)  # Cache for 1 hour
-
-        news_cache_key = 'agro_news'
-        news = cache.get(news_cache_key)
-        if not news:
-            news = getAgroNews()
-            cache.set(news_cache_key, news, timeout=86400)  # Cache for 24 hours
+        details = getWeather(userlogged.coords)
+        news = get_agro_news(limit=3)
 
         context = {
             "user": userlogged,
-            "produces": my_products,
-            "produces_count": my_products.count(),
-            "public_produces_count": public_products.count(),
-            "last_listing": my_products.last() if my_products.exists() else "",
-            'news': news[:3],
+            **get_listing_summary(userlogged),
+            'news': news,
             'weather': details,
         }
         return render(request, 'dash/home.html', context)
@@ -114,9 +138,17 @@ def croprec(request):
         form = CropRecommendationForm(request.POST if request.method == 'POST' else None)
         
         if request.method == 'POST' and form.is_valid():
-            weatherd = getWeatherDetails(userlogged.coords)
+            weatherd = getWeather(userlogged.coords)
+            if weatherd is None:
+                context = {
+                    'form': form,
+                    'user': userlogged,
+                    'userid': userlogged.id,
+                    'error': WEATHER_UNAVAILABLE_MESSAGE
+                }
+                return render(request, 'dash/tools/crop_rec.html', context, status=503)
             try:
-                data = np.array([[
+                features = getCropFeatures(
                     form.cleaned_data['nitrogen'],
                     form.cleaned_data['phosphorus'],
                     form.cleaned_data['potassium'],
@@ -124,13 +156,13 @@ def croprec(request):
                     weatherd[2],  # humidity
                     form.cleaned_data['PH'],
                     form.cleaned_data['rainfall']
-                ]])
-                prediction = cropRecommendationModel.predict(data)
+                )
+                prediction = cropBatcher.predict(features, timeout=INFERENCE_TIMEOUT)
                 context = {
                     'form': form,
                     'user': userlogged,
                     'userid': userlogged.id,
-                    'prediction': prediction[0]
+                    'prediction': prediction
                 }
             except Exception as e:
                 logger.error(f"Crop recommendation prediction error: {str(e)}")
@@ -152,6 +184,100 @@ def croprec(request):
         request.session["error_message"] = "Please Login to Continue"
         return redirect('/admin/404/')
 
+BATCH_PREDICT_MAX_ROWS = getattr(settings, "BATCH_PREDICT_MAX_ROWS", 10000)
+
+def _read_batch_rows(request):
+    upload = request.FILES.get("file")
+    if upload:
+        body, is_csv = upload.read(), upload.name.lower().endswith(".csv")
+    else:
+        body, is_csv = request.body, request.content_type == "text/csv"
+    text = body.decode("utf-8-sig")
+    if is_csv:
+        return list(csv.DictReader(io.StringIO(text)))
+    payload = json.loads(text)
+    return payload["rows"] if isinstance(payload, dict) else payload
+
+# Batch API: many soil-test rows in, one vectorized predict, results streamed back
+def batch_predict_api(request, kind):
+    try:
+        if request.method != "POST":
+            return JsonResponse({"error": "Method not allowed"}, status=405)
+
+        logged_id = request.session.get("member_logged_id")
+        if not logged_id:
+            return JsonResponse({"error": "User not logged in"}, status=401)
+
+        if kind not in modelRegistry:
+            return JsonResponse({"error": f"Unknown model: {kind}"}, status=404)
+        try:
+            model = modelRegistry.get(kind)
+        except ModelUnavailable:
+            return JsonResponse({"error": "Model not available"}, status=503)
+
+        try:
+            rows = _read_batch_rows(request)
+        except (ValueError, KeyError, TypeError) as e:
+            return JsonResponse({"error": f"Invalid batch payload: {e}"}, status=400)
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            return JsonResponse({"error": "Batch must be a list of objects"}, status=400)
+        if len(rows) > BATCH_PREDICT_MAX_ROWS:
+            return JsonResponse({"error": f"Batch exceeds {BATCH_PREDICT_MAX_ROWS} rows"}, status=413)
+
+        # Only look up the weather if some row lacks its own readings
+        weather = None
+        if any("temperature" not in row or "humidity" not in row for row in rows):
+            weather = getWeather(getDetailsFromUID(logged_id).coords)
+
+        results = iterBatchResults(kind, model, rows, weather)
+        if request.GET.get("format") == "csv":
+            def stream():
+                buffer = io.StringIO()
+                writer = csv.DictWriter(buffer, fieldnames=["row", "prediction", "confidence", "error"])
+                writer.writeheader()
+                for result in results:
+                    writer.writerow(result)
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            return StreamingHttpResponse(stream(), content_type="text/csv")
+        return StreamingHttpResponse(
+            (json.dumps(result) + "\n" for result in results),
+            content_type="application/x-ndjson",
+        )
+    except Exception as e:
+        logger.error(f"Batch prediction error: {str(e)}")
+        return JsonResponse({"error": str(e)}, status=500)
+
+def inference_stats_api(request):
+    if not request.session.get("member_logged_id"):
+        return JsonResponse({"error": "User not logged in"}, status=401)
+    return JsonResponse({
+        "batchers": [cropBatcher.stats(), fertilizerBatcher.stats()],
+        "models": modelRegistry.stats(),
+    })
+
+def upstream_stats_api(request):
+    if not request.session.get("member_logged_id"):
+        return JsonResponse({"error": "User not logged in"}, status=401)
+    return JsonResponse({"upstreams": getUpstreamStats()})
+
+def feed_status_api(request):
+    if not request.session.get("member_logged_id"):
+        return JsonResponse({"error": "User not logged in"}, status=401)
+    return JsonResponse({"feeds": getFeedStatuses()})
+
+def cache_stats_api(request):
+    if not request.session.get("member_logged_id"):
+        return JsonResponse({"error": "User not logged in"}, status=401)
+    return JsonResponse({"object_cache": objectCache.stats()})
+
+def chatbot_cache_stats_api(request):
+    if not request.session.get("member_logged_id"):
+        return JsonResponse({"error": "User not logged in"}, status=401)
+    response_cache = getChatbotEngine().response_cache
+    return JsonResponse({"response_cache": response_cache.stats() if response_cache else None})
+
 def news_page(request):
     try:
         logged_id = request.session.get("member_logged_id")
@@ -160,14 +286,12 @@ def news_page(request):
             
         userlogged = getDetailsFromUID(logged_id)
         
-        news_cache_key = 'agro_news'
-        news = cache.get(news_cache_key)
-        if not news:
-            news = getAgroNews()
-            cache.set(news_cache_key, news, timeout=86400)
-            
+        keyword = request.GET.get("q", "").strip()
+        news = get_agro_news(keyword=keyword or None)
+
         context = {
             'news': news,
+            'keyword': keyword,
             'user': userlogged,
             'userid': userlogged.id,
         }
@@ -188,10 +312,17 @@ def fertrec(request):
         form = FertilizerPredictionForm(request.POST if request.method == 'POST' else None)
         
         if request.method == 'POST' and form.is_valid():
-            weatherd = getWeatherDetails(userlogged.coords)
+            weatherd = getWeather(userlogged.coords)
+            if weatherd is None:
+                context = {
+                    'form': form,
+                    'user': userlogged,
+                    'userid': userlogged.id,
+                    'error': WEATHER_UNAVAILABLE_MESSAGE
+                }
+                return render(request, 'dash/tools/fert_rec.html', context, status=503)
             try:
-                prediction = getFertilizerRecommendation(
-                    fertilizerRecommendModel,
+                features = getFertilizerFeatures(
                     form.cleaned_data['nitrogen'],
                     form.cleaned_data['phosphorus'],
                     form.cleaned_data['potassium'],
@@ -201,6 +332,7 @@ def fertrec(request):
                     form.cleaned_data['soil_type'],
                     form.cleaned_data['crop']
                 )
+                prediction = fertilizerBatcher.predict(features, timeout=INFERENCE_TIMEOUT)
                 context = {
                     'form': form,
                     'user': userlogged,
@@ -235,17 +367,16 @@ def crop_prices_page(request):
             
         userlogged = getDetailsFromUID(logged_id)
         
-        prices_cache_key = f'prices_{logged_id}'
-        latest_prices = cache.get(prices_cache_key)
-        if not latest_prices:
-            latest_prices = getMarketPricesAllStates()
-            cache.set(prices_cache_key, latest_prices, timeout=3600)
+        # Shared across all users and refreshed in the background
+        price_index = getMarketPriceIndex()
+        fetched_at = price_index.fetched_at
             
         context = {
             "userid": userlogged.id,
             "user": userlogged,
-            "date": datetime.datetime.now(),
-            "prices": latest_prices
+            "date": datetime.datetime.fromtimestamp(fetched_at) if fetched_at else datetime.datetime.now(),
+            "prices": price_index.records,
+            "prices_refreshing": fetched_at is None,
         }
         return render(request, 'dash/check_prices.html', context)
     except Exception as e:
@@ -253,6 +384,69 @@ def crop_prices_page(request):
         request.session["error_message"] = "Please Login to Continue"
         return redirect('/admin/404/')
 
+def prices_api(request):
+    try:
+        if not request.session.get("member_logged_id"):
+            return JsonResponse({"error": "User not logged in"}, status=401)
+
+        params = request.GET
+        try:
+            since = datetime.date.fromisoformat(params["since"]) if params.get("since") else None
+            until = datetime.date.fromisoformat(params["until"]) if params.get("until") else None
+            if params.get("days"):
+                since = datetime.date.today() - datetime.timedelta(days=int(params["days"]))
+            limit = min(max(int(params.get("limit", 50)), 1), 500)
+            price_index = getMarketPriceIndex()
+            records, total, next_cursor = price_index.query(
+                state=params.get("state"),
+                district=params.get("district"),
+                commodity=params.get("commodity"),
+                market=params.get("market"),
+                since=since,
+                until=until,
+                sort=params.get("sort", "-arrival_date"),
+                cursor=params.get("cursor"),
+                limit=limit,
+            )
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        return JsonResponse({
+            "count": total,
+            "next_cursor": next_cursor,
+            "fetched_at": price_index.fetched_at,
+            "results": records,
+        })
+    except Exception as e:
+        logger.error(f"Prices API error: {str(e)}")
+        return JsonResponse({"error": str(e)}, status=500)
+
+def price_trends_api(request):
+    try:
+        if not request.session.get("member_logged_id"):
+            return JsonResponse({"error": "User not logged in"}, status=401)
+
+        params = request.GET
+        if not params.get("commodity"):
+            return JsonResponse({"error": "commodity is required"}, status=400)
+        try:
+            since = datetime.date.fromisoformat(params["since"]) if params.get("since") else None
+            until = datetime.date.fromisoformat(params["until"]) if params.get("until") else None
+            trends = getPriceTrends(
+                params["commodity"],
+                market=params.get("market"),
+                state=params.get("state"),
+                since=since,
+                until=until,
+                period=params.get("period", "day"),
+            )
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        return JsonResponse({"commodity": params["commodity"], "results": trends})
+    except Exception as e:
+        logger.error(f"Price trends error: {str(e)}")
+        return JsonResponse({"error": str(e)}, status=500)
+
 def profile_page(request):
     try:
         logged_id = request.session.get("member_logged_id")
@@ -333,7 +527,7 @@ def check_my_listings(request):
             raise ValueError("User not logged in")
             
         userlogged = getDetailsFromUID(logged_id)
-        produces = Produce.objects.filter(farmerid=userlogged.id)
+        produces = Produce.objects.filter(farmerid=userlogged.id).with_farmers()
         
         context = {
             'user': userlogged,
@@ -345,6 +539,114 @@ def check_my_listings(request):
         request.session["error_message"] = "Please Login to Continue"
         return redirect('/admin/404/')
 
+def serialize_listing(produce):
+    return {
+        "id": produce.id,
+        "farmerid": produce.farmerid,
+        "name": produce.name,
+        "price": float(produce.price),
+        "quantity": float(produce.quantity),
+        "unit": produce.unit,
+        "created_at": produce.created_at.isoformat(),
+    }
+
+# Buyer-facing marketplace search across every farmer's listings
+def marketplace_search_api(request):
+    try:
+        if not request.session.get("member_logged_id"):
+            return JsonResponse({"error": "User not logged in"}, status=401)
+
+        params = request.GET
+        try:
+            def number(key):
+                return float(params[key]) if params.get(key) else None
+
+            since = None
+            if params.get("days"):
+                since = timezone.now() - datetime.timedelta(days=int(params["days"]))
+            listings, next_cursor = searchListings(
+                query=params.get("q", "").strip(),
+                min_price=number("min_price"),
+                max_price=number("max_price"),
+                min_quantity=number("min_quantity"),
+                since=since,
+                cursor=params.get("cursor"),
+                limit=min(max(int(params.get("limit", 20)), 1), 100),
+            )
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        return JsonResponse({
+            "next_cursor": next_cursor,
+            "results": [serialize_listing(produce) for produce in listings],
+        })
+    except Exception as e:
+        logger.error(f"Marketplace search error: {str(e)}")
+        return JsonResponse({"error": str(e)}, status=500)
+
+LISTING_IMPORT_MAX_ROWS = getattr(settings, "LISTING_IMPORT_MAX_ROWS", 5000)
+
+# Bulk listing upload (CSV or JSON rows of name, price, quantity)
+def import_listings_api(request):
+    try:
+        if request.method != "POST":
+            return JsonResponse({"error": "Method not allowed"}, status=405)
+
+        logged_id = request.session.get("member_logged_id")
+        if not logged_id:
+            return JsonResponse({"error": "User not logged in"}, status=401)
+
+        try:
+            rows = _read_batch_rows(request)
+        except (ValueError, KeyError) as e:
+            return JsonResponse({"error": f"Could not read rows: {e}"}, status=400)
+        if not isinstance(rows, list) or not rows:
+            return JsonResponse({"error": "Expected a non-empty list of rows"}, status=400)
+        if len(rows) > LISTING_IMPORT_MAX_ROWS:
+            return JsonResponse({"error": f"Import exceeds {LISTING_IMPORT_MAX_ROWS} rows"}, status=413)
+
+        created, errors = importListings(int(logged_id), rows)
+        if errors:
+            return JsonResponse({"error": "Some rows are invalid, nothing was imported", "rows": errors}, status=400)
+        return JsonResponse({"created": created}, status=201)
+    except Exception as e:
+        logger.error(f"Listing import error: {str(e)}")
+        return JsonResponse({"error": str(e)}, status=500)
+
+def export_listings(request):
+    try:
+        logged_id = request.session.get("member_logged_id")
+        if not logged_id:
+            return JsonResponse({"error": "User not logged in"}, status=401)
+
+        rows = iterListingRows(int(logged_id))
+        if request.GET.get("format") == "json":
+            def stream():
+                yield "["
+                for n, row in enumerate(rows):
+                    yield ("," if n else "") + json.dumps(row)
+                yield "]"
+            response = StreamingHttpResponse(stream(), content_type="application/json")
+            filename = "listings.json"
+        else:
+            def stream():
+                buffer = io.StringIO()
+                writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+                writer.writeheader()
+                for row in rows:
+                    writer.writerow(row)
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                yield buffer.getvalue()
+            response = StreamingHttpResponse(stream(), content_type="text/csv")
+            filename = "listings.csv"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+    except Exception as e:
+        logger.error(f"Listing export error: {str(e)}")
+        return JsonResponse({"error": str(e)}, status=500)
+
 def delete_listing(request, id):
     try:
         logged_id = request.session.get("member_logged_id")
@@ -363,6 +665,59 @@ def delete_listing(request, id):
 def layout_dashboard(request):
     return render(request, 'dash/layout_dashboard.html')
 
+def build_chatbot_reply(response):
+    # Calculate carbon_percentage (max 100 kg CO₂e for demo)
+    carbon_emission = response.get("CarbonEmission", 0)
+    # Prefer the deterministic local estimate whenever the structured inputs are known
+    try:
+        emission_breakdown = estimateEmission(response) if hasEmissionInputs(response) else None
+    except ValueError as e:
+        logger.error(f"Carbon estimate skipped: {str(e)}")
+        emission_breakdown = None
+    if emission_breakdown:
+        carbon_emission = emission_breakdown["total"]
+    max_emission = 100  # Adjust this based on your app’s scale
+    carbon_percentage = min(100, (carbon_emission / max_emission) * 100) if carbon_emission > 0 else 0
+
+    # Prepare JSON response for React
+    return {
+        "response": response.get("response", "N/A") if isinstance(response, dict) else response,
+        "CarbonEmission": carbon_emission,
+        "carbon_percentage": carbon_percentage,
+        "emission_breakdown": emission_breakdown,
+        "fertilizer_recommendations": response.get("fertilizer_recommendations", []),
+        "farming_practices": response.get("farming_practices", {}),
+        "crop_details": response.get("crop_details", []),
+        "suggestions": response.get("suggestions", []),
+        "crop_residue_management": response.get("crop_residue_management", "none")
+    }
+
+def load_chatbot_turn(session):
+    """(conversation, history_state) for the farmer logged in to `session`."""
+    conversation = getConversation(session, session["member_logged_id"])
+    return conversation, loadHistoryState(conversation)
+
+def finish_chatbot_turn(conversation, response, updated_conversation_history):
+    """Store the new turn and return (response_data, status) for the JSON reply."""
+    if isinstance(response, dict) and "error" in response:
+        return {"error": response["error"]}, 500
+
+    recordTurn(conversation, updated_conversation_history)
+    return build_chatbot_reply(response), 200
+
+def run_chatbot_turn(session, query):
+    """Run one chatbot turn for the farmer logged in to `session`.
+
+    History is read from and appended to the chat store; the session only
+    holds the conversation id. Returns (response_data, status) for the JSON reply.
+    """
+    conversation, conversation_history = load_chatbot_turn(session)
+
+    # Get response from the AI
+    response, updated_conversation_history = GetResponse(query, conversation_history)
+
+    return finish_chatbot_turn(conversation, response, updated_conversation_history)
+
 # API Endpoint for React Chatbot
 def chatbot_api(request):
     try:
@@ -377,44 +732,86 @@ def chatbot_api(request):
         if not query:
             return JsonResponse({"error": "Query cannot be empty"}, status=400)
 
-        # Retrieve histories from session
-        chat_history = request.session.get("chatlog", {"queries": [], "responses": []})
-        conversation_history = request.session.get("conversation_history", [])
-
-        # Get response from the AI
-        response, updated_conversation_history = GetResponse(query, conversation_history)
-
-        if isinstance(response, dict) and "error" in response:
-            return JsonResponse({"error": response["error"]}, status=500)
-
-        # Calculate carbon_percentage (max 100 kg CO₂e for demo)
-        carbon_emission = response.get("CarbonEmission", 0)
-        max_emission = 100  # Adjust this based on your app’s scale
-        carbon_percentage = min(100, (carbon_emission / max_emission) * 100) if carbon_emission > 0 else 0
-
-        # Update chat history for display
-        chat_history["queries"].append(query)
-        chat_history["responses"].append(response if isinstance(response, str) else json.dumps(response))
-        request.session["chatlog"] = chat_history
-        request.session["conversation_history"] = updated_conversation_history
-
-        # Prepare JSON response for React
-        response_data = {
-            "response": response.get("response", "N/A") if isinstance(response, dict) else response,
-            "CarbonEmission": carbon_emission,
-            "carbon_percentage": carbon_percentage,
-            "fertilizer_recommendations": response.get("fertilizer_recommendations", []),
-            "farming_practices": response.get("farming_practices", {}),
-            "crop_details": response.get("crop_details", []),
-            "suggestions": response.get("suggestions", []),
-            "crop_residue_management": response.get("crop_residue_management", "none")
-        }
-        return JsonResponse(response_data)
+        response_data, status = run_chatbot_turn(request.session, query)
+        return JsonResponse(response_data, status=status)
 
     except Exception as e:
         logger.error(f"Chatbot API error: {str(e)}")
         return JsonResponse({"error": str(e)}, status=500)
 
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Streaming variant of chatbot_api: forwards Gemini output as server-sent events
+def chatbot_stream_api(request):
+    try:
+        if request.method != "POST":
+            return JsonResponse({"error": "Method not allowed"}, status=405)
+
+        logged_id = request.session.get("member_logged_id")
+        if not logged_id:
+            return JsonResponse({"error": "User not logged in"}, status=401)
+
+        query = request.POST.get("query", "").strip()
+        if not query:
+            return JsonResponse({"error": "Query cannot be empty"}, status=400)
+
+        conversation = getConversation(request.session, logged_id)
+        conversation_history = loadHistoryState(conversation)
+
+        def stream():
+            for event in GetResponseStream(query, conversation_history):
+                if event[0] == "delta":
+                    yield sse_event("delta", {"text": event[1]})
+                elif event[0] == "field":
+                    yield sse_event("field", {"key": event[1], "value": event[2]})
+                elif event[0] == "error":
+                    yield sse_event("error", {"error": event[1]})
+                else:
+                    _, response, updated_conversation_history = event
+                    recordTurn(conversation, updated_conversation_history)
+                    yield sse_event("done", build_chatbot_reply(response))
+
+        response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    except Exception as e:
+        logger.error(f"Chatbot stream API error: {str(e)}")
+        return JsonResponse({"error": str(e)}, status=500)
+
+# Cooperative-level reporting: emissions for many farm profiles in one call
+def carbon_report_api(request):
+    try:
+        if request.method != "POST":
+            return JsonResponse({"error": "Method not allowed"}, status=405)
+        if not request.session.get("member_logged_id"):
+            return JsonResponse({"error": "User not logged in"}, status=401)
+
+        try:
+            payload = json.loads(request.body)
+        except ValueError as e:
+            return JsonResponse({"error": f"Invalid JSON: {e}"}, status=400)
+        profiles = payload.get("profiles") if isinstance(payload, dict) else payload
+        if not isinstance(profiles, list) or not all(isinstance(profile, dict) for profile in profiles):
+            return JsonResponse({"error": "Expected a list of farm profiles"}, status=400)
+
+        try:
+            results = estimateEmissions(profiles)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        return JsonResponse({
+            "results": [
+                {name: round(float(results[name][i]), 1) for name in (*COMPONENTS, "total")}
+                for i in range(len(profiles))
+            ],
+            "summary": {name: round(float(results[name].sum()), 1) for name in (*COMPONENTS, "total")},
+        })
+    except Exception as e:
+        logger.error(f"Carbon report error: {str(e)}")
+        return JsonResponse({"error": str(e)}, status=500)
+
 # Layout View for Rendering HTML with Iframe
 def help_page(request):
     try:
@@ -429,7 +826,7 @@ def help_page(request):
             "userid": userlogged.id,
             "user": userlogged,
             "latest_response": request.session.get("latest_response", {}),
-            "chatlog": request.session.get("chatlog", {"queries": [], "responses": []}),
+            "chatlog": getChatlog(getConversation(request.session, logged_id, create=False)),
         }
         return render(request, "dash/help.html", context)
 
@@ -0,0 +1,54 @@
+from django.conf import settings
+
+from .functions import getWeatherDetails
+from .object_cache import FEEDS_WORKER, getOrCompute, refreshCached
+
+# Farms within the same grid cell share one cached weather reading
+WEATHER_GRID_DEGREES = getattr(settings, 'WEATHER_GRID_DEGREES', 0.05)
+WEATHER_CACHE_TIMEOUT = getattr(settings, 'WEATHER_CACHE_TIMEOUT', 1800)
+WEATHER_FETCH_WAIT = 20  # seconds a coalesced caller waits for the leader's fetch
+# Keep serving a reading for up to a day if refreshes fail
+WEATHER_FRESHNESS = {'timeout': WEATHER_CACHE_TIMEOUT, 'stale_timeout': 86400}
+
+
+def parseCoords(coords):
+    # User.coords may be stored as "lat,lon" or as a (lat, lon) sequence
+    if isinstance(coords, str):
+        coords = coords.strip("()[] ").split(",")
+    return float(coords[0]), float(coords[1])
+
+
+def snapToGrid(lat, lon, step=None):
+    step = step or WEATHER_GRID_DEGREES
+    return round(round(lat / step) * step, 4), round(round(lon / step) * step, 4)
+
+
+def getWeatherCellKey(coords):
+    lat, lon = snapToGrid(*parseCoords(coords))
+    return f'weather_cell_{lat}_{lon}', (lat, lon)
+
+
+def getWeather(coords):
+    """Weather for the grid cell containing coords.
+
+    Cached per cell; concurrent misses for the same cell wait on a single
+    upstream call, and a reading is served for up to another timeout while
+    it is refreshed. With the feeds worker enabled this only reads the cache,
+    except for a cell the worker has not fetched yet (say, a newly registered
+    farm), which is fetched once here. None if no reading is available.
+    """
+    key, cell = getWeatherCellKey(coords)
+
+    def fetch():
+        return getWeatherDetails(cell)
+
+    weather = getOrCompute(key, fetch, read_only=FEEDS_WORKER, wait=WEATHER_FETCH_WAIT, **WEATHER_FRESHNESS)
+    if weather is None and FEEDS_WORKER:
+        weather = getOrCompute(key, fetch, wait=WEATHER_FETCH_WAIT, **WEATHER_FRESHNESS)
+    return weather
+
+
+def refreshWeatherCell(coords):
+    """Fetch and cache one grid cell's weather now (used by ingest_feeds)."""
+    key, cell = getWeatherCellKey(coords)
+    return refreshCached(key, lambda: getWeatherDetails(cell), **WEATHER_FRESHNESS)